@@ -0,0 +1,62 @@
+"""
+The cache module stores a parsed and indexed library on disk.
+
+Loading the cache only needs pickle and the classes of the parsed tables, so a
+run hitting the cache never imports the PTF grammar nor starts a worker pool.
+The cache is keyed by the path, size and modification time of every part
+table file: any change to the library makes it stale.
+"""
+
+import os
+import pickle
+import tempfile
+import library
+from index import PartIndex
+
+# Bumped whenever the pickled layout of PartIndex changes
+VERSION = 2
+
+
+def fingerprint(path: str) -> list[tuple[str, int, int]]:
+    """
+    Giving the path to the libraries, returns the path, size and modification
+    time of every part table file of the valid libraries, in discovery order.
+    """
+    entries = []
+    for lib_dir in library.list_valid(path):
+        for table_path in library.find_parttable_files(lib_dir):
+            stat = os.stat(table_path)
+            entries.append((os.path.relpath(table_path, path), stat.st_size, stat.st_mtime_ns))
+    return entries
+
+
+def load(cache_path: str, entries: list[tuple[str, int, int]]) -> PartIndex | None:
+    """
+    Returns the cached index, or None when there is no cache, when it was
+    saved for another state of the library or by another version of the code.
+    """
+    try:
+        with open(cache_path, "rb") as f:
+            version, cached_entries, index = pickle.load(f)
+    except (
+        OSError,
+        EOFError,
+        ValueError,
+        TypeError,
+        AttributeError,
+        ImportError,
+        pickle.UnpicklingError,
+    ):
+        return None
+    if version != VERSION or cached_entries != entries or not isinstance(index, PartIndex):
+        return None
+    return index
+
+
+def save(cache_path: str, entries: list[tuple[str, int, int]], index: PartIndex) -> None:
+    # entries must be taken before parsing, so that files modified in between
+    # invalidate the cache
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        pickle.dump((VERSION, entries, index), tmp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp.name, cache_path)
@@ -1,9 +1,15 @@
-from parsy import seq, ParseError
 import logging
-from combinators import part_name, class_name, header, rows, end_part, end, key_val, filetype
 import os
 import re
 from dataclasses import dataclass
+from itertools import chain
+
+
+class PartTableError(Exception):
+    """
+    A part table file that cannot be read, or whose rows do not fit its header.
+    """
+
 
 def sanitize_lines(lines: list[str]) -> list[str]:
     # if the line doesn't start by { the whole line is not a comment
@@ -154,14 +160,14 @@ class Row:
 
     def containsValue(self, value: str)->bool:
         value = value.upper()
-        for prop in self.properties:
+        for prop in chain(self.keyProperties, self.derivedProperties):
             if value in prop.value.upper():
                 return True
         return False
 
     def getProperty(self, nameProperty: str) -> str:
         nameProperty = nameProperty.upper()
-        for prop in self.properties:
+        for prop in chain(self.keyProperties, self.derivedProperties):
             if nameProperty in prop.column.upper():
                 return prop.value
         return ''
@@ -252,8 +258,9 @@ class PartTable:
         try:
             self.rows = [Row(row, self.header) for row in rows]
         except Exception as e:
-            logging.error(f"Error in PartTable: {self.class_type} - {self.name} -> {e}")
-            os._exit(-1)
+            raise PartTableError(
+                f"Error in PartTable: {self.class_type} - {self.name} -> {e}"
+            ) from e
 
     def format(self):
         padding = self.calculate_max_padding()
@@ -275,16 +282,21 @@ class PartTable:
         return result
 
     def calculate_max_padding(self):
-        max_characters = [len(prop) for prop in self.header.getValuesProperties()]
+        """
+        Single pass over the rows, reading the property values directly instead
+        of building the string list of every row.
+        """
+        max_characters = [len(str(prop)) for prop in self.header.properties]
 
         for row in self.rows:
-            nameSpecPos = row.numKeyProperties - 1
+            nameSpecPos = len(row.keyProperties) - 1
             nameSpec_padding = len(row.nameSpec) + 1 # space between last keyProperty and the nameSpecification
-            for index, rowProp in enumerate(row.getValuesProperties()):
+            for index, rowProp in enumerate(chain(row.keyProperties, row.derivedProperties)):
+                length = len(rowProp.value)
                 if index == nameSpecPos and nameSpec_padding > 1:
-                    max_characters[index] = max(max_characters[index], len(str(rowProp)) + nameSpec_padding)
-                else:
-                    max_characters[index] = max(max_characters[index], len(str(rowProp)))
+                    length += nameSpec_padding
+                if length > max_characters[index]:
+                    max_characters[index] = length
         return max_characters
 
     def build_multi(name: str, class_type: str, headerRaw: str, rows: list[str]):
@@ -377,7 +389,6 @@ class PartTableFile:
     def __init__(self, filetype, partTables):
         self.filetype = filetype
         self.partTables = partTables
-        self.format()
 
     def format(self):
         file_line = "FILE_TYPE = " + self.filetype + ";\n"
@@ -407,7 +418,15 @@ class PartTableFile:
 
         return library_name.upper()
 
-    def parse(path):
+    def parse(path, strict=True):
+        # The grammar is only imported when a file is actually parsed, so that
+        # loading already parsed tables (e.g. from a cache) stays cheap.
+        # A file that cannot be read or whose rows do not fit their header ends
+        # the process, unless strict is False: PartTableError is raised instead,
+        # for long running commands that must survive a bad file.
+        from parsy import seq, ParseError
+        from combinators import part_name, class_name, header, rows, end_part, end, key_val, filetype
+
         try:
             logging.info("Parsing: "+path)
             f = open(path, encoding='utf_8')
@@ -436,6 +455,8 @@ class PartTableFile:
         except ParseError:
             logging.exception("Parsing " + path)
         except Exception as e:
+            if not strict:
+                raise PartTableError(f"{path}: {e}") from e
             print(e, flush=True)
             print(path, flush=True)
             os._exit(-1)
@@ -2,17 +2,21 @@
 The css module is used to parse Cadence's css files.
 """
 
-import shlex
+import re
+
+# Same splitting rules as shlex.split(line, posix=False): a token is either a
+# quoted string kept with its quotes, or a run of non whitespace characters.
+_TOKEN = re.compile(r"""'[^']*'|"[^"]*"|[^ \t\r\n]+""")
+# Only connection (C) and property (P) records are of interest to the scanner.
+_RECORD = re.compile(r"[ \t\r\n]*([CP])[ \t\r\n]")
 
 
 class CssElement:
-    pass
+    __slots__ = ()
 
 
 class CssConnection(CssElement):
-    x = 0
-    y = 0
-    name = ""
+    __slots__ = ("name", "x", "y")
 
     def __init__(self, tokens):
         self.x = int(tokens[0])
@@ -24,8 +28,7 @@ class CssConnection(CssElement):
 
 
 class CssProperty(CssElement):
-    name = ""
-    value = ""
+    __slots__ = ("name", "value")
 
     def __init__(self, tokens):
         self.name = tokens[0]
@@ -45,18 +48,50 @@ class CssEmpty(CssElement):
 
 
 class Factory:
-
     def parseLine(self, line):
-        token = shlex.split(line, posix=False)
+        token = _TOKEN.findall(line)
         if len(token) == 0:
             return CssEmpty()
-        elif token[0] == 'C' and len(token) == 11:
+        elif token[0] == "C" and len(token) == 11:
             return CssConnection(token[1:])
-        elif token[0] == 'X':
+        elif token[0] == "X":
             return CssX()
-        elif token[0] == 'L' and len(token) == 7:
+        elif token[0] == "L" and len(token) == 7:
             return CssLine()
-        elif token[0] == 'P' and len(token) == 16:
+        elif token[0] == "P" and len(token) == 16:
             return CssProperty(token[1:])
         else:
             return CssEmpty()
+
+
+def scan(lines):
+    """
+    Yields the CssConnection and CssProperty records found in the given lines.
+    Every other record is skipped without being tokenized.
+    """
+    for line in lines:
+        record = _RECORD.match(line)
+        if record is None:
+            continue
+        tokens = _TOKEN.findall(line, record.end())
+        if record.group(1) == "C":
+            if len(tokens) == 10:
+                yield CssConnection(tokens)
+        elif len(tokens) == 15:
+            yield CssProperty(tokens)
+
+
+def scan_file(path):
+    with open(path, encoding="utf_8", errors="replace") as f:
+        yield from scan(f)
+
+
+def off_grid_connections(path) -> list[CssConnection]:
+    """
+    Returns the connections of a symbol file that are not on the 10 unit pin grid.
+    """
+    return [
+        element
+        for element in scan_file(path)
+        if isinstance(element, CssConnection) and not element.onGrid()
+    ]
@@ -0,0 +1,156 @@
+"""
+The diff module compares two revisions of a library row by row.
+
+Rows are keyed by (library, cell, PART, part number) and compared through a
+hash of their content. Part table files with identical content in both
+revisions are skipped without being parsed, so only the files that changed
+between the two revisions cost any parsing.
+"""
+
+import concurrent.futures
+import hashlib
+import logging
+import os
+import library
+from cell import PartTableError, PartTableFile
+
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+# A revision of the file does not parse, its rows are left out of the diff
+UNPARSABLE = "unparsable"
+
+# (library, cell, PART, part number)
+RowKey = tuple[str, str, str, str]
+
+
+def file_hashes(path: str) -> dict[str, str]:
+    """
+    Returns the content hash of every part table file of the valid libraries,
+    keyed by path relative to the libraries.
+    """
+    table_paths = []
+    for lib_dir in library.list_valid(path):
+        table_paths.extend(library.find_parttable_files(lib_dir))
+
+    def file_hash(table_path):
+        with open(table_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        hashes = executor.map(file_hash, table_paths)
+        return {
+            os.path.relpath(table_path, path): digest
+            for table_path, digest in zip(table_paths, hashes)
+        }
+
+
+def file_key(table_path: str) -> RowKey:
+    # Library and cell of a part table file, whether it parses or not
+    table_file = PartTableFile("", [])
+    table_file.path = table_path
+    return (table_file.library(), table_file.cell(), "", "")
+
+
+def row_hashes(table_path: str) -> dict[RowKey, tuple[str, tuple[str, ...]]] | None:
+    """
+    Returns the content hash and the property values of every row of a part
+    table file, or None when the file cannot be parsed. Rows sharing a part
+    number in a table get a #n suffix from the second one on.
+    """
+    try:
+        table_file = PartTableFile.parse(table_path, strict=False)
+    except PartTableError:
+        logging.exception("Parsing " + table_path)
+        return None
+    if table_file is None:
+        return None
+    rows = {}
+    library_name, cell_name = table_file.library(), table_file.cell()
+    for table in table_file.partTables:
+        for row in table.rows:
+            part_number = row.partNumber
+            key = (library_name, cell_name, table.name, part_number)
+            occurrence = 1
+            while key in rows:
+                occurrence += 1
+                key = (library_name, cell_name, table.name, f"{part_number}#{occurrence}")
+            content = str(row) + row.nameSpec
+            digest = hashlib.blake2b(content.encode("utf_8"), digest_size=16).hexdigest()
+            rows[key] = (digest, tuple(prop.value for prop in row.properties))
+    return rows
+
+
+def diff_libraries(old_path: str, new_path: str) -> list[tuple[str, RowKey, tuple[str, ...]]]:
+    """
+    Giving the paths to two revisions of the libraries, this function returns
+    the added, removed and modified rows as (change, key, values) tuples, where
+    values are the property values of the row in the revisions it exists in.
+    A file that does not parse in one of the revisions is reported once as
+    UNPARSABLE, with an empty PART and part number, instead of its rows.
+    """
+    old_files, new_files = file_hashes(old_path), file_hashes(new_path)
+    changed = sorted(
+        key
+        for key in old_files.keys() | new_files.keys()
+        if old_files.get(key) != new_files.get(key)
+    )
+    old_keys = [key for key in changed if key in old_files]
+    new_keys = [key for key in changed if key in new_files]
+
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        old_results = executor.map(row_hashes, [os.path.join(old_path, key) for key in old_keys])
+        new_results = executor.map(row_hashes, [os.path.join(new_path, key) for key in new_keys])
+        old_tables = dict(zip(old_keys, old_results))
+        new_tables = dict(zip(new_keys, new_results))
+
+    changes = []
+    old_rows, new_rows = {}, {}
+    for key in changed:
+        old_table, new_table = old_tables.get(key, {}), new_tables.get(key, {})
+        if old_table is None or new_table is None:
+            changes.append((UNPARSABLE, file_key(os.path.join(new_path, key)), ()))
+            continue
+        old_rows.update(old_table)
+        new_rows.update(new_table)
+
+    for key, (digest, values) in new_rows.items():
+        if key not in old_rows:
+            changes.append((ADDED, key, values))
+        elif old_rows[key][0] != digest:
+            changes.append((MODIFIED, key, values + old_rows[key][1]))
+    for key, (_, values) in old_rows.items():
+        if key not in new_rows:
+            changes.append((REMOVED, key, values))
+    changes.sort(key=lambda change: change[1])
+    return changes
+
+
+def affected_line_items(
+    changes: list[tuple[str, RowKey, tuple[str, ...]]],
+    line_items: list[list[str]],
+    part_type_idx: int,
+    part_num_idx: int,
+) -> list[tuple[list[str], list[str]]]:
+    """
+    Returns the BOM line items whose enrichment is affected by the changes,
+    each with the descriptions of the changes affecting it. A line item is
+    affected by a changed row of its part type that it matches, following the
+    matching rules of PartTable.search.
+    """
+    by_part_type = {}
+    for change, key, values in changes:
+        upper_values = [value.upper() for value in values]
+        by_part_type.setdefault(key[2], []).append((change, key, upper_values))
+
+    affected = []
+    for item in line_items:
+        part_number = item[part_num_idx].upper()
+        descriptions = [
+            f"{change} {key[0]}/{key[1]}/{key[3]}"
+            for change, key, values in by_part_type.get(item[part_type_idx], ())
+            if any(part_number in value for value in values)
+        ]
+        if descriptions:
+            affected.append((item, descriptions))
+    return affected
@@ -0,0 +1,78 @@
+"""
+The enrich module looks up BOM line items in the part tables of the library.
+"""
+
+import csv
+from index import PartIndex, match_rows
+
+
+def enrich_stream(
+    line_items: list[list[str]],
+    part_type_idx: int,
+    part_num_idx: int,
+    columns: list[str],
+    table_files,
+    index: PartIndex | None = None,
+) -> tuple[PartIndex, list[list[list[str]]]]:
+    """
+    Enriches BOM line items while the library is still being ingested.
+
+    table_files yields (seq, PartTableFile) pairs in any order. Each published
+    table is searched right away for the line items waiting on its PART name,
+    so only the lines of tables that are still being parsed have to wait.
+
+    The tables are published into index, a new PartIndex when not given.
+    Returns the resulting index and, for each line item, the values of the
+    given columns for every matching row, in library discovery order.
+    """
+    waiting: dict[str, list[int]] = {}
+    for line, item in enumerate(line_items):
+        waiting.setdefault(item[part_type_idx], []).append(line)
+
+    if index is None:
+        index = PartIndex()
+    found = [[] for _ in line_items]
+    for seq, table_file in table_files:
+        index.add(seq, table_file)
+        for position, table in enumerate(table_file.partTables):
+            for line in waiting.get(table.name, ()):
+                for values in match_rows(table, line_items[line][part_num_idx], columns):
+                    found[line].append(((seq, position), values))
+
+    matches = []
+    for line_matches in found:
+        # Stable sort, rows of a table stay in table order
+        line_matches.sort(key=lambda match: match[0])
+        matches.append([values for _, values in line_matches])
+    return index, matches
+
+
+def enrich_index(
+    line_items: list[list[str]],
+    part_type_idx: int,
+    part_num_idx: int,
+    columns: list[str],
+    index: PartIndex,
+) -> list[list[list[str]]]:
+    """
+    Enriches BOM line items against a fully ingested library.
+    """
+    return [index.lookup(item[part_type_idx], item[part_num_idx], columns) for item in line_items]
+
+
+def read_bom(
+    bomfile, part_number_column_name: str, part_type_column_name: str
+) -> tuple[list[str], list[list[str]], int, int]:
+    """
+    Reads a BOM CSV from an open file.
+
+    Returns the title row, the line items and the indexes of the part number
+    and part type columns.
+    """
+    bomreader = csv.reader(bomfile, delimiter=",", quotechar='"')
+    bom_line_items = list(bomreader)
+    part_num_idx = (bom_line_items[0]).index(part_number_column_name)
+    part_type_idx = (bom_line_items[0]).index(part_type_column_name)
+    title_row_columns = bom_line_items[0]
+    del bom_line_items[0]
+    return title_row_columns, bom_line_items, part_num_idx, part_type_idx
@@ -1,14 +1,16 @@
 #! /usr/bin/env python3
 
+# Only the modules needed to enrich a BOM from a cached library are imported
+# here. Parsing, worker pools and the other commands import what they need
+# when they run.
 import os
+import cache
 import library
-from cell import PartTableFile, PartTable
-from combinators import filetype
+import writers
+from enrich import enrich_index, enrich_stream, read_bom
+from fuzzy import report_misses
+from index import PartIndex, describe_collisions
 from argparse import ArgumentParser
-from pathlib import Path
-from typing import (
-    List,
-)
 import logging
 import sys
 import csv
@@ -20,21 +22,192 @@ logger.addHandler(handler)
 
 
 ################################################################################
-def ingest_libraries(libroot) -> List[PartTableFile]:
-    # Get all valid part table files in the repo
-    part_lib_paths = library.list_valid(libroot)
-    # Create PartLibrary objects out of all part table files in each library
-    ptf_table_files = []
-    for lib_dir in part_lib_paths:
-        tables_in_dir = library.find_parttable_files(lib_dir)
-        for table_path in tables_in_dir:
-            table_file = PartTableFile.parse(table_path)
-            ptf_table_files.append(table_file)
-    return ptf_table_files
+def files_in_flight(max_memory):
+    # Under a memory budget, keep at most a couple of parsed files per parser
+    # waiting for the index, instead of the whole library
+    return 2 * (os.cpu_count() or 1) if max_memory is not None else None
+
+
+def index_libraries(libroot, max_memory=None) -> PartIndex:
+    index = PartIndex(max_memory)
+    for seq, table_file in library.stream_part_table_files(
+        libroot, max_in_flight=files_in_flight(max_memory)
+    ):
+        index.add(seq, table_file)
+    return index
+
+
+def log_collisions(index: PartIndex) -> None:
+    for description in describe_collisions(index):
+        logger.warning(description)
 
 
 ################################################################################
-if __name__ == "__main__":
+def check_grid(argv) -> int:
+    parser = ArgumentParser(prog="entrypoint.py check-grid")
+    parser.add_argument("--library_path", required=True, help="Path to library")
+    args = parser.parse_args(argv)
+
+    library_path = os.path.join(args.library_path, "share", "library")
+    off_grid = library.check_symbol_grid(library_path)
+    for symbol_file, connections in sorted(off_grid.items()):
+        for connection in connections:
+            print(f"{symbol_file}: {connection.name} ({connection.x}, {connection.y}) is off grid")
+    return 1 if off_grid else 0
+
+
+################################################################################
+def diff(argv) -> int:
+    parser = ArgumentParser(prog="entrypoint.py diff")
+    parser.add_argument("--old_library_path", required=True, help="Path to the old library")
+    parser.add_argument("--new_library_path", required=True, help="Path to the new library")
+    parser.add_argument("--output_path", help="Path for the report, printed when not given")
+    parser.add_argument(
+        "--bom_file",
+        help="Path to a BOM file. When given, only its line items affected by the changes are reported",
+    )
+    parser.add_argument(
+        "--part_number_column_name",
+        help="Name of the column in the input BOM that contains part numbers",
+    )
+    parser.add_argument(
+        "--part_type_column_name",
+        help="Name of the column in the input BOM that contains part types",
+    )
+    args = parser.parse_args(argv)
+    if args.bom_file and not (args.part_number_column_name and args.part_type_column_name):
+        parser.error("--bom_file requires --part_number_column_name and --part_type_column_name")
+
+    import diff as library_diff
+
+    changes = library_diff.diff_libraries(
+        os.path.join(args.old_library_path, "share", "library"),
+        os.path.join(args.new_library_path, "share", "library"),
+    )
+    for change, key, _ in changes:
+        if change == library_diff.UNPARSABLE:
+            logger.warning("%s/%s does not parse, its rows are left out of the diff", *key[:2])
+
+    fp = open(args.output_path, "w") if args.output_path else sys.stdout
+    try:
+        writer = csv.writer(fp)
+        if args.bom_file:
+            with open(args.bom_file, newline="") as bomfile:
+                title_row_columns, bom_line_items, part_num_idx, part_type_idx = read_bom(
+                    bomfile, args.part_number_column_name, args.part_type_column_name
+                )
+            writer.writerow([*title_row_columns, "Library Changes"])
+            for item, descriptions in library_diff.affected_line_items(
+                changes, bom_line_items, part_type_idx, part_num_idx
+            ):
+                writer.writerow([*item, "; ".join(descriptions)])
+        else:
+            writer.writerow(["change", "library", "cell", "part", "part_number"])
+            for change, key, _ in changes:
+                writer.writerow([change, *key])
+    finally:
+        if fp is not sys.stdout:
+            fp.close()
+    return 0
+
+
+################################################################################
+def format_library(argv) -> int:
+    parser = ArgumentParser(prog="entrypoint.py format-library")
+    parser.add_argument("--library_path", required=True, help="Path to library")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only report the part table files that are not normalized, without writing them",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Path to a JSON file keeping the hashes of normalized part table files between runs",
+    )
+    args = parser.parse_args(argv)
+
+    import formatter
+
+    library_path = os.path.join(args.library_path, "share", "library")
+    statuses = formatter.format_library(library_path, args.cache, args.check)
+    for table_path, status in statuses.items():
+        if status != formatter.UNCHANGED:
+            print(f"{table_path}: {status}")
+    if args.check:
+        return 0 if all(status == formatter.UNCHANGED for status in statuses.values()) else 1
+    failed = (formatter.FAILED, formatter.LOSSY)
+    return 0 if not any(status in failed for status in statuses.values()) else 1
+
+
+################################################################################
+def query(argv) -> int:
+    parser = ArgumentParser(prog="entrypoint.py query")
+    parser.add_argument("part_numbers", nargs="*", help="Part numbers to look up")
+    parser.add_argument("--library_path", required=True, help="Path to library")
+    parser.add_argument(
+        "--part_numbers_file",
+        help="Path to a file with one part number per line, for bulk lookups",
+    )
+    parser.add_argument(
+        "--cache_path",
+        help="Path to a cache of the parsed library. It is used when the library did not change since it was saved, and saved again otherwise",
+    )
+    args = parser.parse_args(argv)
+
+    part_numbers = list(args.part_numbers)
+    if args.part_numbers_file:
+        with open(args.part_numbers_file) as fp:
+            part_numbers.extend(line.strip() for line in fp if line.strip())
+
+    library_path = os.path.join(args.library_path, "share", "library")
+    index = None
+    if args.cache_path:
+        cache_entries = cache.fingerprint(library_path)
+        index = cache.load(args.cache_path, cache_entries)
+    if index is None:
+        index = index_libraries(library_path)
+        if args.cache_path:
+            cache.save(args.cache_path, cache_entries, index)
+    log_collisions(index)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["part_number", "library", "cell", "part", "row"])
+    for part_number in part_numbers:
+        usages = index.where_used(part_number)
+        for usage in usages:
+            writer.writerow([part_number, usage.library, usage.cell, usage.part, usage.row])
+        if not usages:
+            # Keep part numbers without any use in the output
+            writer.writerow([part_number, "", "", "", ""])
+    return 0
+
+
+################################################################################
+def serve(argv) -> int:
+    import server
+
+    parser = ArgumentParser(prog="entrypoint.py serve")
+    parser.add_argument("--library_path", required=True, help="Path to library")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=2.0,
+        help="Seconds between two checks of the library for modified part table files",
+    )
+    args = parser.parse_args(argv)
+
+    server_logger = logging.getLogger(server.__name__)
+    server_logger.addHandler(handler)
+    server_logger.setLevel("INFO")
+    server_logger.propagate = False
+    server.serve(args.library_path, args.host, args.port, args.poll_interval)
+    return 0
+
+
+################################################################################
+def generate_bom(argv) -> int:
     # Initialize argument parser
     parser = ArgumentParser()
     parser.add_argument("bom_file", help="Path to the input BOM file")
@@ -66,49 +239,207 @@ if __name__ == "__main__":
         help="A comma separated value list of the column names to add to the output BOM. The order must match the corresponding sequence provided with the --include_ptf_columns argument",
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--server",
+        default=os.environ.get("HDL_LIBRARY_SERVER"),
+        help="URL of a server started with the serve command. The BOM is forwarded to it when it serves the same library, e.g. http://127.0.0.1:8765",
+    )
+
+    parser.add_argument(
+        "--miss_report",
+        action="store_true",
+        help="Write the BOM line items without a match, with the closest part numbers of the searched PTF column, next to the output BOM",
+    )
+    parser.add_argument(
+        "--suggestions",
+        type=int,
+        default=3,
+        help="Number of closest part numbers suggested for each line item of the miss report",
+    )
+    parser.add_argument(
+        "--output_format",
+        choices=writers.FORMATS,
+        default=writers.CSV,
+        help="Format of the output BOM file. parquet requires pyarrow",
+    )
+    parser.add_argument(
+        "--multiple_matches",
+        choices=writers.POLICIES,
+        help="How several PTF rows matching a line item fill the added columns: append repeats the column groups (csv only, default for csv), first keeps the first match, join joins the values of each column, rows writes one row per match (default for other formats)",
+    )
+
+    parser.add_argument(
+        "--cache_path",
+        help="Path to a cache of the parsed library. It is used when the library did not change since it was saved, and saved again otherwise",
+    )
+
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Number of worker processes enriching the BOM line items, for very large BOMs. The library lookups are shared with the workers through a memory mapped file",
+    )
+
+    parser.add_argument(
+        "--max_memory",
+        type=int,
+        help="Memory budget in MB for the parsed part tables. Tables over the budget are spilled to a temporary SQLite database, with the same results",
+    )
+
+    args = parser.parse_args(argv)
+    if args.output_format == writers.PARQUET and not writers.parquet_available():
+        parser.error("--output_format parquet requires pyarrow")
+    if args.multiple_matches is None:
+        args.multiple_matches = (
+            writers.APPEND if args.output_format == writers.CSV else writers.ROWS
+        )
+    elif args.multiple_matches == writers.APPEND and args.output_format != writers.CSV:
+        parser.error(
+            "--multiple_matches append produces ragged rows and requires --output_format csv"
+        )
     library_root = args.library_path
-    output_path = args.output_path
     part_number_column_name = args.part_number_column_name
     part_type_column_name = args.part_type_column_name
-    search_ptf_column_name = args.search_ptf_column_name
     use_ptf_cols = [item.strip() for item in args.include_ptf_columns.split(",")]
     new_bom_cols = [item.strip() for item in args.add_bom_columns.split(",")]
+    try:
+        writers.check_columns([], use_ptf_cols, new_bom_cols)
+    except ValueError as e:
+        parser.error(str(e))
 
     logger.setLevel("DEBUG")
     logger.info("Running generate-bom-with-hdl-library action.")
     logger.debug("Arguments: %s", vars(args))
 
-    # Ingest all available libraries
-    library_path = os.path.join(library_root, "share", "library")
-    ptf_lib_tables = ingest_libraries(library_path)
+    # Forward to a warm server when one is running for this library. The miss
+    # report is only produced locally.
+    if args.server and not args.miss_report and args.output_format == writers.CSV:
+        import server
+
+        enriched_bom = server.forward(
+            args.server,
+            library_root,
+            args.bom_file,
+            {
+                "part_number_column_name": part_number_column_name,
+                "part_type_column_name": part_type_column_name,
+                "include_ptf_columns": args.include_ptf_columns,
+                "add_bom_columns": args.add_bom_columns,
+                "multiple_matches": args.multiple_matches,
+            },
+        )
+        if enriched_bom is not None:
+            logger.info("BOM enriched by server at %s", args.server)
+            with open(args.output_path, "w", newline="") as fp:
+                fp.write(enriched_bom)
+            return 0
+        logger.warning("No server for this library at %s, running locally", args.server)
 
     # Ingest input BOM
     with open(args.bom_file, newline="") as bomfile:
-        bomreader = csv.reader(bomfile, delimiter=",", quotechar='"')
-        bom_line_items = list(bomreader)
-        part_num_idx = (bom_line_items[0]).index(part_number_column_name)
-        part_type_idx = (bom_line_items[0]).index(part_type_column_name)
-        title_row_columns = bom_line_items[0]
-        del bom_line_items[0]
-
-    for bom_col in new_bom_cols:
-        title_row_columns.append(bom_col)
-
-    for item in bom_line_items:
-        part_type = item[part_type_idx]
-        for lib_table in ptf_lib_tables:
-            for table in lib_table.partTables:
-                available_cols = [prop for prop in table.header.properties]
-                if table.name == part_type:
-                    matching_rows = table.search(item[part_num_idx])
-                    for row in matching_rows:
-                        for col_name in use_ptf_cols:
-                            item.append(row.getProperty(col_name))
-
-    # Update BOM with title rows and output to file
-    if args.output_path is not None:
-        with open(args.output_path, "w") as fp:
-            writer = csv.writer(fp)
-            writer.writerow(title_row_columns)
-            writer.writerows(bom_line_items)
+        title_row_columns, bom_line_items, part_num_idx, part_type_idx = read_bom(
+            bomfile, part_number_column_name, part_type_column_name
+        )
+    try:
+        writers.check_columns(title_row_columns, use_ptf_cols, new_bom_cols)
+    except ValueError as e:
+        parser.error(str(e))
+
+    library_path = os.path.join(library_root, "share", "library")
+    index = None
+    if args.cache_path:
+        cache_entries = cache.fingerprint(library_path)
+        index = cache.load(args.cache_path, cache_entries)
+        if index is not None:
+            logger.info("Library loaded from cache %s", args.cache_path)
+    cache_hit = index is not None
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
+
+    if index is None and args.shards > 1:
+        # Shards need the whole library, they cannot overlap with its ingestion
+        index = index_libraries(library_path, max_memory)
+    elif index is None:
+        # Ingest all available libraries, enriching the BOM line items as their
+        # part tables get parsed
+        index, matches = enrich_stream(
+            bom_line_items,
+            part_type_idx,
+            part_num_idx,
+            use_ptf_cols,
+            library.stream_part_table_files(
+                library_path, max_in_flight=files_in_flight(max_memory)
+            ),
+            PartIndex(max_memory),
+        )
+    try:
+        if args.shards > 1:
+            import shards
+
+            matches = shards.enrich_sharded(
+                bom_line_items, part_type_idx, part_num_idx, use_ptf_cols, index, args.shards
+            )
+        elif cache_hit:
+            matches = enrich_index(bom_line_items, part_type_idx, part_num_idx, use_ptf_cols, index)
+        if index.spilled:
+            logger.info(
+                "Library over the memory budget, part tables spilled to %s", index.store.path
+            )
+        if args.cache_path and not cache_hit and not index.spilled:
+            cache.save(args.cache_path, cache_entries, index)
+        log_collisions(index)
+
+        if args.miss_report:
+            miss_report_path = os.path.splitext(args.output_path)[0] + "_misses.csv"
+            report = report_misses(
+                index,
+                bom_line_items,
+                matches,
+                part_type_idx,
+                part_num_idx,
+                args.search_ptf_column_name,
+                args.suggestions,
+            )
+            logger.info("%d line items without a match, see %s", len(report), miss_report_path)
+            with open(miss_report_path, "w") as fp:
+                writer = csv.writer(fp)
+                writer.writerow(
+                    [
+                        "line",
+                        part_type_column_name,
+                        part_number_column_name,
+                        "reason",
+                        "suggestions",
+                    ]
+                )
+                writer.writerows(report)
+
+        # Update BOM with title rows and output to file
+        if args.output_path is not None:
+            rows = writers.shape_rows(
+                bom_line_items,
+                matches,
+                len(title_row_columns),
+                len(new_bom_cols),
+                args.multiple_matches,
+            )
+            writers.write_bom(
+                args.output_path, args.output_format, title_row_columns + new_bom_cols, rows
+            )
+        return 0
+    finally:
+        index.close()
+
+
+################################################################################
+COMMANDS = {
+    "check-grid": check_grid,
+    "diff": diff,
+    "format-library": format_library,
+    "query": query,
+    "serve": serve,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]))
+    sys.exit(generate_bom(sys.argv[1:]))
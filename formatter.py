@@ -0,0 +1,144 @@
+"""
+The formatter module rewrites part table files in their normalized form, as
+produced by PartTableFile.format.
+
+Files are formatted in parallel worker processes and only the files whose
+content changes are written, atomically. A cache of the content hashes of
+normalized files lets later runs skip those files without parsing them.
+
+Parsing a file does not keep all of its text: comments are dropped and some
+values are cut (e.g. at a ':' in an http link). A file is only rewritten when
+its normalized form keeps every token and comment of the original.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+import library
+from cell import PartTableError, PartTableFile
+
+UNCHANGED = "unchanged"
+FORMATTED = "formatted"
+NEEDS_FORMATTING = "needs formatting"
+FAILED = "failed"
+# The normalized form would lose part of the file
+LOSSY = "lossy"
+
+# Lines made only of {===} decorate the title row and are regenerated
+_DECORATOR = re.compile(r"^\s*\{=*\}\s*$", re.MULTILINE)
+_COMMENT = re.compile(r"\{[^}]*\}")
+_DELIMITERS = re.compile(r"[\s|=:;]+")
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def write_atomic(path: str, content: bytes) -> None:
+    # Write next to the file and swap it in, so readers never see a partial file
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        tmp.write(content)
+    try:
+        shutil.copymode(path, tmp.name)
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+
+def tokens(text: str) -> Counter:
+    return Counter(token for token in _DELIMITERS.split(_DECORATOR.sub("", text)) if token)
+
+
+def is_lossless(original: str, normalized: str) -> bool:
+    """
+    Returns True when normalized keeps every comment of original, except the
+    title row decorators, and every token between whitespace and delimiters.
+    """
+    for comment in _COMMENT.findall(_DECORATOR.sub("", original)):
+        if comment not in normalized:
+            return False
+    return not tokens(original) - tokens(normalized)
+
+
+def format_file(
+    path: str, known_hash: str | None = None, check: bool = False
+) -> tuple[str, str | None]:
+    """
+    Normalizes a part table file.
+    known_hash is the hash of the file when it was last found normalized; the
+    file is not parsed again if its content still has that hash.
+    With check, or when normalizing would lose some of its content, the file is
+    left untouched. A file that cannot be read or parsed is FAILED.
+    Returns the status of the file and the hash of its normalized content.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = content_hash(content)
+    if digest == known_hash:
+        return UNCHANGED, digest
+
+    try:
+        table_file = PartTableFile.parse(path, strict=False)
+    except PartTableError:
+        logging.exception("Formatting " + path)
+        return FAILED, None
+    if table_file is None:
+        return FAILED, None
+    normalized = "".join(table_file.format()).encode("utf_8")
+    if normalized == content:
+        return UNCHANGED, digest
+    if not is_lossless(content.decode("utf_8", errors="replace"), normalized.decode("utf_8")):
+        return LOSSY, None
+    if check:
+        return NEEDS_FORMATTING, None
+
+    write_atomic(path, normalized)
+    return FORMATTED, content_hash(normalized)
+
+
+def _format_entry(entry):
+    return format_file(*entry)
+
+
+def format_library(path: str, cache_path: str | None = None, check: bool = False) -> dict[str, str]:
+    """
+    Giving the path to the libraries, this function normalizes every part table
+    file of the valid libraries and returns the status of each file.
+    cache_path is a JSON file mapping files to the hash of their normalized
+    content, read before and updated after formatting.
+    """
+    cache = {}
+    if cache_path and os.path.isfile(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+
+    table_paths = []
+    for lib_dir in library.list_valid(path):
+        table_paths.extend(library.find_parttable_files(lib_dir))
+    keys = [os.path.relpath(table_path, path) for table_path in table_paths]
+
+    statuses = {}
+    new_cache = {}
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        entries = [
+            (table_path, cache.get(key), check) for table_path, key in zip(table_paths, keys)
+        ]
+        chunksize = max(1, len(entries) // (4 * (os.cpu_count() or 1)))
+        results = executor.map(_format_entry, entries, chunksize=chunksize)
+        for table_path, key, (status, digest) in zip(table_paths, keys, results):
+            statuses[table_path] = status
+            if digest is not None:
+                new_cache[key] = digest
+
+    if cache_path:
+        with open(cache_path, "w") as f:
+            json.dump(new_cache, f, indent=1, sort_keys=True)
+    return statuses
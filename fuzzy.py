@@ -0,0 +1,122 @@
+"""
+The fuzzy module suggests library part numbers close to the ones of BOM line
+items that have no match, e.g. 605248 for 605284 or 0402-1K for 04021k.
+
+Values are normalized (upper cased, punctuation removed) and indexed by
+trigrams, so the candidates of a miss are the values sharing the most
+trigrams with it. Only those candidates are ranked by edit distance.
+"""
+
+import re
+from collections import Counter
+from index import PartIndex
+
+# Number of candidates, by shared trigrams, ranked by edit distance
+CANDIDATES = 32
+
+_PUNCTUATION = re.compile(r"[^0-9A-Z]+")
+
+
+def normalize(value: str) -> str:
+    return _PUNCTUATION.sub("", value.upper())
+
+
+def trigrams(key: str) -> set[str]:
+    padded = "$" + key + "$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def distance(a: str, b: str) -> int:
+    """
+    Edit distance counting insertions, deletions, substitutions and
+    transpositions of adjacent characters.
+    """
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+class FuzzyIndex:
+    """
+    Trigram index over a list of values.
+    """
+
+    def __init__(self, values):
+        self.values: list[str] = []
+        self.keys: list[str] = []
+        self.postings: dict[str, list[int]] = {}
+        seen = set()
+        for value in values:
+            key = normalize(value)
+            if not key or value in seen:
+                continue
+            seen.add(value)
+            value_id = len(self.values)
+            self.values.append(value)
+            self.keys.append(key)
+            for trigram in trigrams(key):
+                self.postings.setdefault(trigram, []).append(value_id)
+
+    def suggest(self, value: str, k: int) -> list[str]:
+        """
+        Returns up to k indexed values closest to value, closest first.
+        """
+        key = normalize(value)
+        if not key:
+            return []
+        shared = Counter()
+        for trigram in trigrams(key):
+            shared.update(self.postings.get(trigram, ()))
+        candidates = [value_id for value_id, _ in shared.most_common(CANDIDATES)]
+        ranked = sorted(
+            candidates, key=lambda value_id: (distance(key, self.keys[value_id]), value_id)
+        )
+        return [self.values[value_id] for value_id in ranked[:k]]
+
+
+def column_values(index: PartIndex, part_type: str, column: str):
+    # Comma separated groups, such as an AML, are indexed as separate values
+    for table in index.tables(part_type):
+        for row in table.rows:
+            for value in row.getProperty(column).replace("'", "").split(","):
+                yield value.strip()
+
+
+def report_misses(
+    index: PartIndex,
+    line_items: list[list[str]],
+    matches: list[list[list[str]]],
+    part_type_idx: int,
+    part_num_idx: int,
+    search_column: str,
+    k: int,
+) -> list[list[str]]:
+    """
+    Returns a report row for each line item without a match: its line number
+    in the BOM, part type, part number, the reason of the miss and the k closest
+    values of the search column in the tables of its part type.
+    """
+    fuzzy_indexes: dict[str, FuzzyIndex] = {}
+    report = []
+    for line, (item, item_matches) in enumerate(zip(line_items, matches)):
+        if item_matches:
+            continue
+        part_type, part_number = item[part_type_idx], item[part_num_idx]
+        if part_type not in index:
+            report.append([str(line + 2), part_type, part_number, "unknown part type", ""])
+            continue
+        if part_type not in fuzzy_indexes:
+            fuzzy_indexes[part_type] = FuzzyIndex(column_values(index, part_type, search_column))
+        suggestions = fuzzy_indexes[part_type].suggest(part_number, k)
+        report.append(
+            [str(line + 2), part_type, part_number, "no matching part", "; ".join(suggestions)]
+        )
+    return report
@@ -0,0 +1,180 @@
+"""
+The index module keeps parsed part tables addressable by their PART name, and
+every part number addressable by the rows that use it.
+"""
+
+import bisect
+from collections.abc import Iterator
+from dataclasses import dataclass
+import store
+from cell import PartTable, PartTableFile, Row
+
+
+@dataclass(frozen=True, slots=True)
+class Usage:
+    """
+    A row of the library using a part number.
+    row is the position of the row in its PART table, starting at 1.
+    """
+
+    library: str
+    cell: str
+    part: str
+    row: int
+
+
+class PartIndex:
+    """
+    Part tables keyed by PART name, and the where-used index of part numbers.
+
+    Tables are published with the sequence number of their file in library
+    discovery order. Tables sharing a name are kept sorted by that order, so
+    lookups report matches in the same order whatever the order of publication.
+    No table of a name takes precedence: all of them contribute matches.
+
+    With max_memory, in bytes, tables published once the estimated size of the
+    tables kept in memory reaches the budget are spilled to a TableStore on
+    disk. Lookups give the same results for spilled tables.
+    """
+
+    def __init__(self, max_memory: int | None = None):
+        # Entries are ((seq, position), (library, cell), table), where table is
+        # a PartTable, or the id of a table spilled to the store
+        self._tables: dict[str, list[tuple[tuple[int, int], tuple[str, str], PartTable | int]]] = {}
+        self._where_used: dict[str, list[tuple[tuple[int, int, int], Usage]]] = {}
+        self.max_memory = max_memory
+        self.memory = 0
+        self.store = None
+
+    def add(self, seq: int, table_file: PartTableFile) -> None:
+        library, cell = table_file.library(), table_file.cell()
+        for position, table in enumerate(table_file.partTables):
+            size = 0
+            if self.max_memory is not None:
+                size = store.estimate_size(table)
+            if self.max_memory is not None and self.memory + size > self.max_memory:
+                self._spill(seq, position, library, cell, table)
+                continue
+            self.memory += size
+
+            entries = self._tables.setdefault(table.name, [])
+            bisect.insort(
+                entries, ((seq, position), (library, cell), table), key=lambda entry: entry[0]
+            )
+            for row_idx, row in enumerate(table.rows):
+                usage = Usage(library, cell, table.name, row_idx + 1)
+                for part_number in part_numbers(row):
+                    usages = self._where_used.setdefault(part_number, [])
+                    bisect.insort(
+                        usages, ((seq, position, row_idx), usage), key=lambda entry: entry[0]
+                    )
+
+    def _spill(self, seq: int, position: int, library: str, cell: str, table: PartTable) -> None:
+        if self.store is None:
+            self.store = store.TableStore()
+        usages = [
+            (part_number, row_idx, library, cell)
+            for row_idx, row in enumerate(table.rows)
+            for part_number in part_numbers(row)
+        ]
+        table_id = self.store.add(seq, position, table, usages)
+        entries = self._tables.setdefault(table.name, [])
+        bisect.insort(
+            entries, ((seq, position), (library, cell), table_id), key=lambda entry: entry[0]
+        )
+
+    @property
+    def spilled(self) -> bool:
+        return self.store is not None
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
+    def __contains__(self, part_type: str) -> bool:
+        return part_type in self._tables
+
+    def part_types(self) -> list[str]:
+        return list(self._tables)
+
+    def tables(self, part_type: str) -> Iterator[PartTable]:
+        # Spilled tables are rebuilt one at a time, as they are iterated
+        for _, _, table in self._tables.get(part_type, ()):
+            yield self.store.table(table) if isinstance(table, int) else table
+
+    def lookup(self, part_type: str, value: str, columns: list[str]) -> list[list[str]]:
+        """
+        Returns the values of the given columns for every row matching value in
+        the tables named part_type.
+        """
+        entries = self._tables.get(part_type, ())
+        if not any(isinstance(table, int) for _, _, table in entries):
+            matches = []
+            for _, _, table in entries:
+                matches.extend(match_rows(table, value, columns))
+            return matches
+
+        found = self.store.search(part_type, value)
+        for (seq, position), _, table in entries:
+            if not isinstance(table, int):
+                found.extend(
+                    ((seq, position, row_idx), row)
+                    for row_idx, row in enumerate(table.rows)
+                    if row.containsValue(value)
+                )
+        found.sort(key=lambda match: match[0])
+        return [[row.getProperty(column) for column in columns] for _, row in found]
+
+    def where_used(self, part_number: str) -> list[Usage]:
+        """
+        Returns every row of the library using part_number, either as its
+        PART_NUMBER or in its AML. The comparison ignores case.
+        """
+        part_number = part_number.strip().upper()
+        usages = list(self._where_used.get(part_number, ()))
+        if self.store is not None:
+            usages.extend((key, Usage(*usage)) for key, usage in self.store.where_used(part_number))
+            usages.sort(key=lambda entry: entry[0])
+        return [usage for _, usage in usages]
+
+    def collisions(self) -> dict[str, list[tuple[str, str]]]:
+        """
+        Returns the PART names defined by more than one library cell, with the
+        (library, cell) pairs defining them in discovery order.
+        """
+        collisions = {}
+        for name, entries in self._tables.items():
+            sources = []
+            for _, source, _ in entries:
+                if source not in sources:
+                    sources.append(source)
+            if len(sources) > 1:
+                collisions[name] = sources
+        return collisions
+
+
+def match_rows(table: PartTable, value: str, columns: list[str]) -> list[list[str]]:
+    return [[row.getProperty(column) for column in columns] for row in table.search(value)]
+
+
+def part_numbers(row: Row) -> set[str]:
+    """
+    Returns the part numbers used by a row: its PART_NUMBER and the
+    manufacturer part numbers of its AML, upper cased.
+    """
+    numbers = {row.partNumber.strip().upper()}
+    for token in row.getProperty("AML").replace("'", "").split(","):
+        numbers.add(token.strip().upper())
+    numbers.difference_update(("", "NONE", "NAN"))
+    return numbers
+
+
+def describe_collisions(index: PartIndex) -> list[str]:
+    descriptions = []
+    for name, sources in index.collisions().items():
+        cells = ", ".join(f"{library}/{cell}" for library, cell in sources)
+        descriptions.append(
+            f"PART '{name}' is defined by {len(sources)} cells, all {len(sources)} cells"
+            f" contribute matches in discovery order: {cells}"
+        )
+    return descriptions
@@ -1,7 +1,11 @@
 from cell import PartTableFile
-import concurrent.futures
 import logging
 import os
+import queue
+import threading
+
+# concurrent.futures and css are imported by the functions using them, listing
+# the libraries does not need them.
 
 
 def list_valid( path ):
@@ -30,6 +34,8 @@ def get_part_table_files(libraries) -> list[PartTableFile]:
     Giving a list of libraries, this function will go in each library and collect all the part table files
     It uses multiple threads to go faster.
     """
+    import concurrent.futures
+
     partFiles = []
     with concurrent.futures.ThreadPoolExecutor() as executor:
         futures = executor.map(find_parttable_files, libraries)
@@ -45,6 +51,69 @@ def get_part_table_files(libraries) -> list[PartTableFile]:
 
         return partFiles1
 
+
+def stream_part_table_files(path, max_workers=None, max_in_flight=None):
+    """
+    Giving the path to the libraries, this function yields (seq, PartTableFile) pairs
+    as soon as each part table file is parsed.
+    Discovery runs in a background thread and streams the paths into a pool of
+    parser processes, so parsing starts before the whole library has been listed.
+    seq is the position of the file in discovery order; files are yielded in
+    completion order. Files that fail to parse are skipped.
+    max_in_flight bounds the number of files submitted but not yet yielded, so
+    that parsed files do not pile up when the consumer is slower than the parsers.
+    """
+    import concurrent.futures
+
+    parsed = queue.Queue()
+    discovery = {}
+    in_flight = threading.Semaphore(max_in_flight) if max_in_flight else None
+    stopped = threading.Event()
+
+    def discover(executor):
+        submitted = 0
+        try:
+            for library in list_valid(path):
+                for table_path in find_parttable_files(library):
+                    if in_flight is not None:
+                        in_flight.acquire()
+                    if stopped.is_set():
+                        return
+                    future = executor.submit(PartTableFile.parse, table_path)
+                    future.add_done_callback(
+                        lambda future, seq=submitted: parsed.put((seq, future))
+                    )
+                    submitted += 1
+        except Exception as e:
+            discovery["error"] = e
+        finally:
+            discovery["total"] = submitted
+            parsed.put((None, None))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        threading.Thread(target=discover, args=(executor,), daemon=True).start()
+        received = 0
+        try:
+            while "total" not in discovery or received < discovery["total"]:
+                seq, future = parsed.get()
+                if future is None:
+                    continue
+                received += 1
+                table_file = future.result()
+                if in_flight is not None:
+                    in_flight.release()
+                if table_file is not None:
+                    yield seq, table_file
+        finally:
+            # Unblock discovery when the consumer stops early
+            stopped.set()
+            if in_flight is not None:
+                in_flight.release()
+
+    if "error" in discovery:
+        raise discovery["error"]
+
+
 def find_parttable_files(library) -> list[PartTableFile]:
     """
     Returns all the part table files in a library.
@@ -70,3 +139,47 @@ def find_parttable_files(library) -> list[PartTableFile]:
                 continue
 
     return partTableFiles
+
+
+def find_symbol_files(library) -> list[str]:
+    """
+    Returns all the symbol.css files in a library, one for each sym_* view of a cell.
+    library: The library to look into.
+    """
+    symbolFiles = []
+
+    for cell in os.scandir(library):
+        if not cell.is_dir():
+            continue
+        for view in os.scandir(cell.path):
+            if view.is_dir() and view.name.startswith("sym_"):
+                symbol_file = os.path.join(view.path, "symbol.css")
+                if os.path.isfile(symbol_file):
+                    symbolFiles.append(symbol_file)
+
+    return symbolFiles
+
+
+def check_symbol_grid(path) -> dict[str, list]:
+    """
+    Giving the path to the libraries, this function checks every symbol of the valid
+    libraries and returns the off grid connections, keyed by symbol file.
+    Symbols are scanned in parallel worker processes.
+    """
+    import concurrent.futures
+    import css
+
+    symbolFiles = []
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        for files in executor.map(find_symbol_files, list_valid(path)):
+            symbolFiles.extend(files)
+
+    offGrid = {}
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        chunksize = max(1, len(symbolFiles) // (4 * (os.cpu_count() or 1)))
+        results = executor.map(css.off_grid_connections, symbolFiles, chunksize=chunksize)
+        for symbol_file, connections in zip(symbolFiles, results):
+            if connections:
+                offGrid[symbol_file] = connections
+
+    return offGrid
@@ -0,0 +1,282 @@
+"""
+The server module keeps a library parsed and indexed between BOM runs.
+
+The library is watched by polling the modification time of its part table
+files, and only the files that changed are parsed again. Enrichment and part
+lookups are served over a local HTTP API:
+
+    GET  /health                  library served by this instance
+    GET  /part?part_type=&value=&columns=
+                                  matching rows of a part type, as JSON
+    POST /enrich?part_number_column_name=&part_type_column_name=
+                 &include_ptf_columns=&add_bom_columns=[&multiple_matches=]
+                                  BOM CSV in the body, enriched BOM CSV returned
+    GET  /where-used?part_number=&part_number=
+    POST /where-used              one part number per line in the body
+                                  library rows using each part number, as JSON
+"""
+
+import concurrent.futures
+import csv
+import dataclasses
+import io
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import library
+from cell import PartTableError, PartTableFile
+import writers
+from enrich import enrich_index, read_bom
+from index import PartIndex, describe_collisions
+
+DEFAULT_PORT = 8765
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_file(path: str) -> PartTableFile | None:
+    # A bad file must not take the server down
+    try:
+        return PartTableFile.parse(path, strict=False)
+    except PartTableError:
+        logger.exception("Parsing " + path)
+        return None
+
+
+def _parse_files(paths: list[str]) -> list[PartTableFile | None]:
+    if len(paths) <= 1:
+        return [_parse_file(path) for path in paths]
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        futures = [executor.submit(_parse_file, path) for path in paths]
+        parsed = []
+        for path, future in zip(paths, futures):
+            try:
+                parsed.append(future.result())
+            except concurrent.futures.BrokenExecutor:
+                logger.exception("Parsing " + path)
+                parsed.append(None)
+        return parsed
+
+
+class LibraryWatcher:
+    """
+    A parsed library, kept up to date with the part table files on disk.
+    """
+
+    def __init__(self, library_root: str):
+        self.library_root = os.path.realpath(library_root)
+        self.library_path = os.path.join(self.library_root, "share", "library")
+        self.index = PartIndex()
+        self._order: list[str] = []
+        self._files: dict[str, tuple[int, PartTableFile | None]] = {}
+        self._lock = threading.Lock()
+
+    def _discover(self) -> dict[str, int]:
+        # Part table files in discovery order, with their modification time
+        stamps = {}
+        for lib_dir in library.list_valid(self.library_path):
+            for table_path in library.find_parttable_files(lib_dir):
+                try:
+                    stamps[table_path] = os.stat(table_path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+        return stamps
+
+    def refresh(self) -> bool:
+        """
+        Parses the part table files added or modified since the last refresh and
+        rebuilds the index. A modified file that fails to parse keeps its last
+        good parse. Returns False when nothing changed.
+        """
+        with self._lock:
+            stamps = self._discover()
+            changed = [
+                path
+                for path, mtime in stamps.items()
+                if path not in self._files or self._files[path][0] != mtime
+            ]
+            order = list(stamps)
+            if not changed and order == self._order:
+                return False
+
+            for path, table_file in zip(changed, _parse_files(changed)):
+                if table_file is None and path in self._files:
+                    # A file being edited may not parse yet, keep its last good parse
+                    logger.warning("Keeping the last parse of %s", path)
+                    table_file = self._files[path][1]
+                self._files[path] = (stamps[path], table_file)
+            for path in set(self._files) - set(stamps):
+                del self._files[path]
+            self._order = order
+
+            index = PartIndex()
+            for seq, path in enumerate(order):
+                table_file = self._files[path][1]
+                if table_file is not None:
+                    index.add(seq, table_file)
+            # Requests in flight keep the index they started with
+            self.index = index
+
+            logger.info("Indexed %d part table files, %d parsed", len(order), len(changed))
+            for description in describe_collisions(index):
+                logger.warning(description)
+            return True
+
+    def watch(self, poll_interval: float) -> None:
+        while True:
+            time.sleep(poll_interval)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Refreshing " + self.library_path)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = _query(url)
+        watcher = self.server.watcher
+        if url.path == "/health":
+            self._reply(200, "application/json", json.dumps({"library_path": watcher.library_root}))
+        elif url.path == "/part":
+            try:
+                matches = watcher.index.lookup(
+                    query["part_type"], query["value"], _columns(query["columns"])
+                )
+            except KeyError as e:
+                return self._reply(400, "text/plain", f"Missing parameter {e}")
+            self._reply(200, "application/json", json.dumps({"matches": matches}))
+        elif url.path == "/where-used":
+            part_numbers = urllib.parse.parse_qs(url.query).get("part_number", [])
+            self._reply(200, "application/json", where_used_json(watcher.index, part_numbers))
+        else:
+            self._reply(404, "text/plain", "Not found")
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf_8")
+        if url.path == "/where-used":
+            part_numbers = [line.strip() for line in body.splitlines() if line.strip()]
+            return self._reply(
+                200, "application/json", where_used_json(self.server.watcher.index, part_numbers)
+            )
+        if url.path != "/enrich":
+            return self._reply(404, "text/plain", "Not found")
+        query = _query(url)
+        try:
+            enriched_bom = enrich_csv(self.server.watcher.index, body, query)
+        except (KeyError, ValueError, IndexError) as e:
+            return self._reply(400, "text/plain", f"Invalid request: {e}")
+        self._reply(200, "text/csv", enriched_bom)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _reply(self, status: int, content_type: str, content: str) -> None:
+        data = content.encode("utf_8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _query(url) -> dict[str, str]:
+    return {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+
+
+def _columns(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",")]
+
+
+def where_used_json(index: PartIndex, part_numbers: list[str]) -> str:
+    return json.dumps(
+        {
+            part_number: [dataclasses.asdict(usage) for usage in index.where_used(part_number)]
+            for part_number in part_numbers
+        }
+    )
+
+
+def enrich_csv(index: PartIndex, bom: str, query: dict[str, str]) -> str:
+    """
+    Enriches a BOM CSV against an index, with the options of the enrich request.
+    """
+    title_row_columns, bom_line_items, part_num_idx, part_type_idx = read_bom(
+        io.StringIO(bom, newline=""),
+        query["part_number_column_name"],
+        query["part_type_column_name"],
+    )
+    use_ptf_cols = _columns(query["include_ptf_columns"])
+    new_bom_cols = _columns(query["add_bom_columns"])
+    writers.check_columns(title_row_columns, use_ptf_cols, new_bom_cols)
+    matches = enrich_index(bom_line_items, part_type_idx, part_num_idx, use_ptf_cols, index)
+    rows = writers.shape_rows(
+        bom_line_items,
+        matches,
+        len(title_row_columns),
+        len(new_bom_cols),
+        query.get("multiple_matches", writers.APPEND),
+    )
+
+    output = io.StringIO(newline="")
+    writer = csv.writer(output)
+    writer.writerow(title_row_columns + new_bom_cols)
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+def serve(library_root: str, host: str, port: int, poll_interval: float) -> None:
+    watcher = LibraryWatcher(library_root)
+    watcher.refresh()
+    threading.Thread(target=watcher.watch, args=(poll_interval,), daemon=True).start()
+
+    httpd = ThreadingHTTPServer((host, port), RequestHandler)
+    httpd.watcher = watcher
+    logger.info("Serving %s on http://%s:%d", watcher.library_root, host, port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def forward(
+    server_url: str, library_root: str, bom_path: str, options: dict[str, str]
+) -> str | None:
+    """
+    Sends a BOM to a running server and returns the enriched BOM CSV.
+    Returns None when no server is reachable or when it serves another library.
+    """
+    server_url = server_url.rstrip("/")
+    try:
+        with urllib.request.urlopen(server_url + "/health", timeout=1) as response:
+            health = json.load(response)
+    except (OSError, ValueError):
+        return None
+    if health.get("library_path") != os.path.realpath(library_root):
+        return None
+
+    with open(bom_path, "rb") as bomfile:
+        bom = bomfile.read()
+    request = urllib.request.Request(
+        server_url + "/enrich?" + urllib.parse.urlencode(options),
+        data=bom,
+        headers={"Content-Type": "text/csv"},
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.read().decode("utf_8")
+    except urllib.error.HTTPError as e:
+        logger.error("Server rejected the BOM: %s", e.read().decode("utf_8"))
+        return None
+    except OSError:
+        return None
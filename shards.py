@@ -0,0 +1,185 @@
+"""
+The shards module enriches a large BOM in several worker processes.
+
+The lookup structures of the library are packed once into a read-only file
+that every worker maps in memory, so the library is neither pickled to nor
+re-ingested by the workers and its pages are shared between them. The BOM
+line items are split in contiguous shards whose matches are merged back in
+the original order.
+
+Layout of the packed file, all integers being 64 bits in native byte order:
+
+    haystacks | values | padding | row offsets | value offsets | JSON header | header size
+
+The file is written as the tables are read, one at a time, so that packing a
+spilled index does not bring the whole library back in memory; only the
+offsets are kept until the end. The JSON header gives the number of columns,
+the sizes of the sections and, for each PART name, its range of rows.
+
+The haystack of a row is the upper cased values of all its properties, each
+followed by a NUL byte, so that a part number matches a row exactly when it is
+found in its haystack, as in Row.containsValue. Values are the ones of the
+requested columns, as returned by Row.getProperty.
+"""
+
+import bisect
+import concurrent.futures
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from typing import BinaryIO
+from index import PartIndex
+
+_OFFSET = "q"
+_SEPARATOR = b"\x00"
+
+
+def pack(index: PartIndex, columns: list[str], fp: BinaryIO) -> None:
+    """
+    Writes the packed lookups of index for the given columns to the binary
+    file fp.
+    """
+    directory = {}
+    row_offsets = array("q", [0])
+    value_offsets = array("q", [0])
+    haystacks_size = 0
+    values_size = 0
+    # Values are only contiguous once all haystacks are written, keep them aside
+    with tempfile.TemporaryFile() as values:
+        for part_type in index.part_types():
+            first_row = len(row_offsets) - 1
+            for table in index.tables(part_type):
+                for row in table.rows:
+                    haystack = b"".join(
+                        prop.value.upper().encode("utf_8") + _SEPARATOR for prop in row.properties
+                    )
+                    fp.write(haystack)
+                    haystacks_size += len(haystack)
+                    row_offsets.append(haystacks_size)
+                    for column in columns:
+                        value = row.getProperty(column).encode("utf_8")
+                        values.write(value)
+                        values_size += len(value)
+                        value_offsets.append(values_size)
+            directory[part_type] = (first_row, len(row_offsets) - 1)
+        values.seek(0)
+        shutil.copyfileobj(values, fp)
+
+    # Keep the offset arrays 8 bytes aligned
+    padding = -(haystacks_size + values_size) % 8
+    fp.write(b"\x00" * padding)
+    row_offsets.tofile(fp)
+    value_offsets.tofile(fp)
+    header = json.dumps(
+        {
+            "columns": len(columns),
+            "haystacks": haystacks_size,
+            "values": values_size,
+            "part_types": directory,
+        }
+    ).encode("utf_8")
+    fp.write(header)
+    fp.write(struct.pack(_OFFSET, len(header)))
+
+
+class PackedIndex:
+    """
+    Read-only view of a packed file, mapped in memory.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (header_size,) = struct.unpack_from(_OFFSET, self.data, len(self.data) - 8)
+        header_start = len(self.data) - 8 - header_size
+        header = json.loads(self.data[header_start : len(self.data) - 8])
+        self.num_columns = header["columns"]
+        self.part_types = {name: tuple(rows) for name, rows in header["part_types"].items()}
+
+        num_rows = max((end for _, end in self.part_types.values()), default=0)
+        num_values = num_rows * self.num_columns
+        self.haystacks = 0
+        self.values = header["haystacks"]
+        start = self.values + header["values"]
+        start += -start % 8
+        view = memoryview(self.data)
+        self.row_offsets = view[start : start + 8 * (num_rows + 1)].cast("q")
+        start += 8 * (num_rows + 1)
+        self.value_offsets = view[start : start + 8 * (num_values + 1)].cast("q")
+
+    def lookup(self, part_type: str, value: str) -> list[list[str]]:
+        """
+        Same result as PartIndex.lookup for the columns the file was packed with.
+        """
+        if part_type not in self.part_types:
+            return []
+        first_row, end_row = self.part_types[part_type]
+        needle = value.upper().encode("utf_8")
+        if not needle:
+            return [self._values(row) for row in range(first_row, end_row)]
+
+        matches = []
+        end = self.haystacks + self.row_offsets[end_row]
+        position = self.data.find(needle, self.haystacks + self.row_offsets[first_row], end)
+        while position != -1:
+            row = bisect.bisect_right(self.row_offsets, position - self.haystacks) - 1
+            matches.append(self._values(row))
+            # Continue with the next row, a row matches only once
+            position = self.data.find(needle, self.haystacks + self.row_offsets[row + 1], end)
+        return matches
+
+    def _values(self, row: int) -> list[str]:
+        first = row * self.num_columns
+        return [
+            self.data[
+                self.values + self.value_offsets[k] : self.values + self.value_offsets[k + 1]
+            ].decode("utf_8")
+            for k in range(first, first + self.num_columns)
+        ]
+
+
+_packed: PackedIndex | None = None
+
+
+def _attach(path: str) -> None:
+    global _packed
+    _packed = PackedIndex(path)
+
+
+def _enrich_shard(keys: list[tuple[str, str]]) -> list[list[list[str]]]:
+    return [_packed.lookup(part_type, part_number) for part_type, part_number in keys]
+
+
+def enrich_sharded(
+    line_items: list[list[str]],
+    part_type_idx: int,
+    part_num_idx: int,
+    columns: list[str],
+    index: PartIndex,
+    workers: int,
+) -> list[list[list[str]]]:
+    """
+    Enriches BOM line items in worker processes. The result is the one of
+    enrich.enrich_index.
+    """
+    keys = [(item[part_type_idx], item[part_num_idx]) for item in line_items]
+    # A few shards per worker, to even out the load
+    shard_size = max(1, -(-len(keys) // (4 * workers)))
+    shards = [keys[start : start + shard_size] for start in range(0, len(keys), shard_size)]
+
+    with tempfile.NamedTemporaryFile(suffix=".idx", delete=False) as tmp:
+        pack(index, columns, tmp)
+    try:
+        matches = []
+        with concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_attach, initargs=(tmp.name,)
+        ) as executor:
+            for shard_matches in executor.map(_enrich_shard, shards):
+                matches.extend(shard_matches)
+        return matches
+    finally:
+        os.unlink(tmp.name)
@@ -0,0 +1,186 @@
+"""
+The store module keeps part tables in a temporary SQLite database, for
+libraries too large to be kept in memory as PartTable objects.
+
+Rows are stored with their properties and a haystack of their upper cased
+values, each followed by a NUL byte, so that lookups follow the rules of
+Row.containsValue in SQL. Lookups are narrowed by the index on part type.
+Tables read back from the store are rebuilt as PartTable objects, without
+parsing them again.
+"""
+
+import json
+import os
+import tempfile
+from cell import ColumnHeader, ColumnRow, Header, PartTable, Row
+
+_SCHEMA = """
+CREATE TABLE part_tables (
+    id INTEGER PRIMARY KEY,
+    part_type TEXT NOT NULL,
+    class_type TEXT NOT NULL,
+    header TEXT NOT NULL
+);
+CREATE TABLE rows (
+    part_type TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    table_id INTEGER NOT NULL,
+    haystack BLOB NOT NULL,
+    properties TEXT NOT NULL
+);
+CREATE INDEX rows_part_type ON rows (part_type, seq, position, row);
+CREATE INDEX rows_table ON rows (table_id, row);
+CREATE TABLE usages (
+    part_number TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    library TEXT NOT NULL,
+    cell TEXT NOT NULL,
+    part TEXT NOT NULL
+);
+CREATE INDEX usages_part_number ON usages (part_number, seq, position, row);
+"""
+
+
+def haystack(row: Row) -> bytes:
+    return b"".join(prop.value.upper().encode("utf_8") + b"\x00" for prop in row.properties)
+
+
+def estimate_size(table: PartTable) -> int:
+    """
+    Approximate memory used by a parsed table, in bytes: object overheads of
+    the rows and their properties plus the length of the values.
+    """
+    size = 0
+    for row in table.rows:
+        size += 400
+        for prop in row.properties:
+            size += 150 + len(prop.value)
+    return size
+
+
+class TableStore:
+    """
+    Temporary SQLite database of part tables, deleted when closed.
+    """
+
+    def __init__(self):
+        # Imported here to keep sqlite off the startup path of runs that never spill
+        import sqlite3
+
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(_SCHEMA)
+
+    def add(self, seq: int, position: int, table: PartTable, usages) -> int:
+        """
+        Stores a table and the where-used entries of its rows, given as
+        (part_number, row, library, cell) tuples. Returns the id of the table.
+        """
+        header = {
+            "keys": [[prop.column, prop.optional] for prop in table.header.keyProperties],
+            "derived": [[prop.column, prop.optional] for prop in table.header.derivedProperties],
+        }
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO part_tables (part_type, class_type, header) VALUES (?, ?, ?)",
+                (table.name, table.class_type, json.dumps(header)),
+            )
+            table_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (table.name, seq, position, row_idx, table_id, haystack(row), _dump_row(row))
+                    for row_idx, row in enumerate(table.rows)
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO usages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (part_number, seq, position, row_idx, library, cell, table.name)
+                    for part_number, row_idx, library, cell in usages
+                ),
+            )
+        return table_id
+
+    def search(self, part_type: str, value: str) -> list[tuple[tuple[int, int, int], Row]]:
+        """
+        Returns the rows of the tables named part_type matching value, with
+        their (seq, position, row) order key.
+        """
+        cursor = self.connection.execute(
+            "SELECT seq, position, row, properties FROM rows"
+            " WHERE part_type = ? AND instr(haystack, ?) > 0"
+            " ORDER BY seq, position, row",
+            (part_type, value.upper().encode("utf_8")),
+        )
+        return [
+            ((seq, position, row), _load_row(properties))
+            for seq, position, row, properties in cursor
+        ]
+
+    def where_used(
+        self, part_number: str
+    ) -> list[tuple[tuple[int, int, int], tuple[str, str, str, int]]]:
+        cursor = self.connection.execute(
+            "SELECT seq, position, row, library, cell, part FROM usages"
+            " WHERE part_number = ? ORDER BY seq, position, row",
+            (part_number,),
+        )
+        return [
+            ((seq, position, row), (library, cell, part, row + 1))
+            for seq, position, row, library, cell, part in cursor
+        ]
+
+    def table(self, table_id: int) -> PartTable:
+        part_type, class_type, header_json = self.connection.execute(
+            "SELECT part_type, class_type, header FROM part_tables WHERE id = ?", (table_id,)
+        ).fetchone()
+        header_columns = json.loads(header_json)
+        header = Header.__new__(Header)
+        header.keyProperties = [
+            ColumnHeader(column, optional) for column, optional in header_columns["keys"]
+        ]
+        header.derivedProperties = [
+            ColumnHeader(column, optional) for column, optional in header_columns["derived"]
+        ]
+
+        table = PartTable.__new__(PartTable)
+        table.name = part_type
+        table.class_type = class_type
+        table.header = header
+        table.rows = [
+            _load_row(properties)
+            for (properties,) in self.connection.execute(
+                "SELECT properties FROM rows WHERE table_id = ? ORDER BY row", (table_id,)
+            )
+        ]
+        return table
+
+    def close(self) -> None:
+        self.connection.close()
+        os.unlink(self.path)
+
+
+def _dump_row(row: Row) -> str:
+    return json.dumps(
+        [
+            [[prop.column, prop.value] for prop in row.keyProperties],
+            [[prop.column, prop.value] for prop in row.derivedProperties],
+            row.nameSpec,
+        ]
+    )
+
+
+def _load_row(properties: str) -> Row:
+    # Rebuilt as is, Row.__init__ would parse a raw PTF line
+    keys, derived, name_spec = json.loads(properties)
+    row = Row.__new__(Row)
+    row.keyProperties = [ColumnRow(column, value) for column, value in keys]
+    row.derivedProperties = [ColumnRow(column, value) for column, value in derived]
+    row.nameSpec = name_spec
+    return row
@@ -0,0 +1,35 @@
+import os
+import shutil
+
+import pytest
+
+HERE = os.path.dirname(__file__)
+LIBRARY = os.path.join(HERE, "library")
+BOM = os.path.join(HERE, "bom.csv")
+
+
+@pytest.fixture
+def library_copy(tmp_path):
+    """
+    A copy of the fixture library that tests may modify.
+    """
+    root = tmp_path / "library"
+    shutil.copytree(LIBRARY, root)
+    return str(root)
+
+
+def table_path(library_root: str, library_name: str, cell_name: str) -> str:
+    return os.path.join(
+        library_root, "share", "library", library_name, cell_name, "part_table", "part.ptf"
+    )
+
+
+def edit(path: str, old: str, new: str) -> None:
+    with open(path) as fp:
+        content = fp.read()
+    assert old in content
+    with open(path, "w") as fp:
+        fp.write(content.replace(old, new))
+    # Make sure the modification time changes, whatever the file system resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
@@ -0,0 +1,67 @@
+import os
+import pickle
+
+import pytest
+from conftest import edit, table_path
+
+import cache
+import entrypoint
+
+
+@pytest.fixture
+def libraries(library_copy):
+    return os.path.join(library_copy, "share", "library")
+
+
+def test_round_trip(libraries, tmp_path):
+    cache_path = str(tmp_path / "library.cache")
+    entries = cache.fingerprint(libraries)
+    index = entrypoint.index_libraries(libraries)
+    cache.save(cache_path, entries, index)
+
+    loaded = cache.load(cache_path, cache.fingerprint(libraries))
+    assert loaded is not None
+    assert loaded.part_types() == index.part_types()
+    for part_type in index.part_types():
+        columns = ["PART_NUMBER", "AML"]
+        assert loaded.lookup(part_type, "", columns) == index.lookup(part_type, "", columns)
+    assert loaded.where_used("2000") == index.where_used("2000")
+
+
+def test_modified_file_invalidates(libraries, library_copy, tmp_path):
+    cache_path = str(tmp_path / "library.cache")
+    cache.save(cache_path, cache.fingerprint(libraries), entrypoint.index_libraries(libraries))
+
+    # Same size, new modification time
+    edit(table_path(library_copy, "ic", "opamp"), "'DUAL'", "'DUO!'")
+    assert cache.load(cache_path, cache.fingerprint(libraries)) is None
+
+
+def test_resized_file_invalidates(libraries, library_copy, tmp_path):
+    cache_path = str(tmp_path / "library.cache")
+    cache.save(cache_path, cache.fingerprint(libraries), entrypoint.index_libraries(libraries))
+
+    path = table_path(library_copy, "ic", "opamp")
+    stat = os.stat(path)
+    with open(path, "a") as fp:
+        fp.write("\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.load(cache_path, cache.fingerprint(libraries)) is None
+
+
+def test_stale_or_broken_cache(libraries, tmp_path):
+    entries = cache.fingerprint(libraries)
+    cache_path = str(tmp_path / "library.cache")
+    assert cache.load(cache_path, entries) is None
+
+    with open(cache_path, "wb") as fp:
+        pickle.dump((cache.VERSION - 1, entries, entrypoint.index_libraries(libraries)), fp)
+    assert cache.load(cache_path, entries) is None
+
+    with open(cache_path, "wb") as fp:
+        pickle.dump((cache.VERSION, entries, {}), fp)
+    assert cache.load(cache_path, entries) is None
+
+    with open(cache_path, "wb") as fp:
+        fp.write(b"not a pickle")
+    assert cache.load(cache_path, entries) is None
@@ -0,0 +1,57 @@
+import os
+import shlex
+
+import pytest
+
+import css
+import library
+from conftest import LIBRARY
+
+LIBRARIES = os.path.join(LIBRARY, "share", "library")
+OPAMP_SYMBOL = os.path.join(LIBRARIES, "ic", "opamp", "sym_1", "symbol.css")
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "C 0 0 0 0 0 0 0 0 0 IN+",
+        "C 15 20 0 0 0 0 0 0 0 'PIN 2'",
+        'P 1 2 3 4 5 6 7 8 9 10 11 12 13 14 "VAL X"',
+        "  L\t1 2  3 4 5 6\r\n",
+        "P 0 0 0 0 0 0 0 0 0 0 0 0 0 NAME 'it''s'",
+        "",
+    ],
+)
+def test_tokens_match_shlex(line):
+    assert css._TOKEN.findall(line) == shlex.split(line, posix=False)
+
+
+def test_scan():
+    with open(OPAMP_SYMBOL) as fp:
+        elements = list(css.scan(fp))
+    assert [type(element) for element in elements] == [
+        css.CssConnection,
+        css.CssConnection,
+        css.CssConnection,
+        css.CssProperty,
+    ]
+    assert [(element.name, element.x, element.y) for element in elements[:3]] == [
+        ("IN+", 0, 0),
+        ("'IN -'", 0, 20),
+        ("OUT", 45, 10),
+    ]
+    assert (elements[3].name, elements[3].value) == ("PART_NAME", '"OPAMP"')
+
+
+def test_off_grid_connections():
+    connections = css.off_grid_connections(OPAMP_SYMBOL)
+    assert [(connection.name, connection.x, connection.y) for connection in connections] == [
+        ("OUT", 45, 10)
+    ]
+
+
+def test_check_symbol_grid():
+    off_grid = library.check_symbol_grid(LIBRARIES)
+    assert {path: [c.name for c in connections] for path, connections in off_grid.items()} == {
+        OPAMP_SYMBOL: ["OUT"]
+    }
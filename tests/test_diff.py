@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import diff
+from conftest import BOM, LIBRARY, edit, table_path
+from enrich import read_bom
+
+
+def libraries(library_root: str) -> str:
+    return os.path.join(library_root, "share", "library")
+
+
+def test_unparsable_file_is_left_out_of_the_row_diff(library_copy):
+    edit(table_path(library_copy, "ic", "opamp"), "'QUAD' | ''", "'QUAD' | '' | 'EXTRA'")
+    edit(table_path(library_copy, "discrete", "res_smd"), "'RES 47K'", "'RES 47K 1W'")
+
+    changes = diff.diff_libraries(libraries(LIBRARY), libraries(library_copy))
+    assert [(change, key) for change, key, _ in changes] == [
+        (diff.MODIFIED, ("DISCRETE", "RES_SMD", "RES-SMD", "3000")),
+        (diff.UNPARSABLE, ("IC", "OPAMP", "", "")),
+    ]
+
+
+def test_removed_unparsable_file(tmp_path, library_copy):
+    old_root = str(tmp_path / "old")
+    shutil.copytree(library_copy, old_root)
+    edit(table_path(old_root, "ic", "opamp"), "'QUAD' | ''", "'QUAD' | '' | 'EXTRA'")
+    shutil.rmtree(os.path.dirname(os.path.dirname(table_path(library_copy, "ic", "opamp"))))
+
+    changes = diff.diff_libraries(libraries(old_root), libraries(library_copy))
+    assert [(change, key) for change, key, _ in changes] == [
+        (diff.UNPARSABLE, ("IC", "OPAMP", "", "")),
+    ]
+
+
+def test_added_removed_and_modified_rows(library_copy):
+    path = table_path(library_copy, "discrete", "res_smd")
+    # Modified
+    edit(path, "'RES 47K'", "'RES 47K 1W'")
+    # Removed
+    edit(path, "'22K' | '1%' | '2000' (!) = '0402A' | 'RES 22K' | 'ACME R22K'\n", "")
+    # Added
+    edit(
+        path, "END_PART", "'68K' | '1%' | '5000' (!) = '0402A' | 'RES 68K' | 'ACME R68K'\nEND_PART"
+    )
+
+    changes = diff.diff_libraries(libraries(LIBRARY), libraries(library_copy))
+    assert [(change, key) for change, key, _ in changes] == [
+        (diff.REMOVED, ("DISCRETE", "RES_SMD", "RES-SMD", "2000")),
+        (diff.MODIFIED, ("DISCRETE", "RES_SMD", "RES-SMD", "3000")),
+        (diff.ADDED, ("DISCRETE", "RES_SMD", "RES-SMD", "5000")),
+    ]
+    # Values of the new revision, then of the old one
+    assert changes[1][2][4] == "'RES 47K 1W'"
+    assert changes[1][2][10] == "'RES 47K'"
+
+    with open(BOM, newline="") as fp:
+        _, line_items, part_num_idx, part_type_idx = read_bom(fp, "Part Number", "Part Type")
+    affected = diff.affected_line_items(changes, line_items, part_type_idx, part_num_idx)
+    assert [(item[0], descriptions) for item, descriptions in affected] == [
+        ("R2", ["removed DISCRETE/RES_SMD/2000"]),
+        (
+            "R3",
+            [
+                "removed DISCRETE/RES_SMD/2000",
+                "modified DISCRETE/RES_SMD/3000",
+                "added DISCRETE/RES_SMD/5000",
+            ],
+        ),
+    ]
+
+
+def test_identical_libraries():
+    assert diff.diff_libraries(libraries(LIBRARY), libraries(LIBRARY)) == []
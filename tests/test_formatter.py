@@ -0,0 +1,75 @@
+import json
+import os
+
+import formatter
+from conftest import edit, table_path
+
+
+def test_bad_files_fail_without_stopping_the_run(library_copy):
+    opamp = table_path(library_copy, "ic", "opamp")
+    edit(opamp, "'QUAD' | ''", "'QUAD' | '' | 'EXTRA'")
+    project_specific = table_path(library_copy, "project_specific", "res_smd")
+    with open(project_specific, "ab") as fp:
+        fp.write(b"\xff\xfe")
+
+    statuses = formatter.format_library(os.path.join(library_copy, "share", "library"))
+    assert statuses[opamp] == formatter.FAILED
+    assert statuses[project_specific] == formatter.FAILED
+    assert statuses[table_path(library_copy, "discrete", "res_smd")] == formatter.FORMATTED
+
+
+def read(path):
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+def test_format_file_is_idempotent(library_copy):
+    path = table_path(library_copy, "discrete", "res_smd")
+    status, digest = formatter.format_file(path)
+    assert status == formatter.FORMATTED
+    formatted = read(path)
+    assert digest == formatter.content_hash(formatted)
+
+    assert formatter.format_file(path) == (formatter.UNCHANGED, digest)
+    assert read(path) == formatted
+    assert formatter.format_file(path, check=True) == (formatter.UNCHANGED, digest)
+
+
+def test_check_leaves_the_file_alone(library_copy):
+    path = table_path(library_copy, "discrete", "res_smd")
+    original = read(path)
+    assert formatter.format_file(path, check=True) == (formatter.NEEDS_FORMATTING, None)
+    assert read(path) == original
+
+
+def test_lossy_comment(library_copy):
+    path = table_path(library_copy, "ic", "opamp")
+    edit(path, "'QUAD' |", "{ reviewed by QA } 'QUAD' |")
+    original = read(path)
+    assert formatter.format_file(path) == (formatter.LOSSY, None)
+    assert read(path) == original
+
+
+def test_lossy_link(library_copy):
+    path = table_path(library_copy, "ic", "opamp")
+    edit(path, "'QUAD OPAMP'", "'http://example.com/opa4'")
+    original = read(path)
+    assert formatter.format_file(path) == (formatter.LOSSY, None)
+    assert read(path) == original
+
+
+def test_cache_skips_unchanged_files(library_copy, monkeypatch, tmp_path):
+    libraries = os.path.join(library_copy, "share", "library")
+    cache_path = str(tmp_path / "format.json")
+    formatter.format_library(libraries, cache_path)
+    with open(cache_path) as fp:
+        cache = json.load(fp)
+    assert len(cache) == 3
+
+    def parse(*args, **kwargs):
+        raise AssertionError("a normalized file was parsed again")
+
+    monkeypatch.setattr(formatter.PartTableFile, "parse", parse)
+    for key, digest in cache.items():
+        path = os.path.join(libraries, key)
+        assert formatter.format_file(path, digest) == (formatter.UNCHANGED, digest)
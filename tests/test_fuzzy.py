@@ -0,0 +1,32 @@
+import fuzzy
+
+
+def test_distance_counts_transpositions_once():
+    assert fuzzy.distance("605284", "605248") == 1
+    assert fuzzy.distance("605284", "605284") == 0
+    assert fuzzy.distance("605284", "60528") == 1
+
+
+def test_suggest_transposition():
+    index = fuzzy.FuzzyIndex(["605248", "LR201001R075F", "123456"])
+    assert index.suggest("605284", 1) == ["605248"]
+
+
+def test_suggest_normalizes_case_and_dashes():
+    index = fuzzy.FuzzyIndex(["0402-1K", "0603-1K"])
+    assert index.suggest("04021k", 1) == ["0402-1K"]
+    assert index.suggest("0402 1k", 1) == ["0402-1K"]
+
+
+def test_suggest_top_k_closest_first():
+    index = fuzzy.FuzzyIndex(["ABC1000", "ABC1234", "ABC1200", "XYZ9999", "ABC1230"])
+    assert index.suggest("ABC1234", 3) == ["ABC1234", "ABC1230", "ABC1200"]
+    # Ties keep the indexing order
+    assert index.suggest("ABC1239", 2) == ["ABC1234", "ABC1230"]
+
+
+def test_suggest_nothing_to_match():
+    index = fuzzy.FuzzyIndex(["605248", "", "--"])
+    assert index.values == ["605248"]
+    assert index.suggest("", 3) == []
+    assert index.suggest("ZZZZZZ", 3) == []
@@ -0,0 +1,86 @@
+import csv
+import os
+
+import pytest
+
+import entrypoint
+
+HERE = os.path.dirname(__file__)
+LIBRARY = os.path.join(HERE, "library")
+BOM = os.path.join(HERE, "bom.csv")
+
+
+def generate(tmp_path, name, *options):
+    output_path = str(tmp_path / f"{name}.csv")
+    status = entrypoint.generate_bom(
+        [
+            BOM,
+            "--library_path",
+            LIBRARY,
+            "--output_path",
+            output_path,
+            "--part_number_column_name",
+            "Part Number",
+            "--part_type_column_name",
+            "Part Type",
+            "--search_ptf_column_name",
+            "PART_NUMBER",
+            "--include_ptf_columns",
+            "PART_NUMBER,AML",
+            "--add_bom_columns",
+            "PN,MPN",
+            "--miss_report",
+            *options,
+        ]
+    )
+    assert status == 0
+    with open(output_path, newline="") as fp:
+        rows = list(csv.reader(fp))
+    with open(str(tmp_path / f"{name}_misses.csv"), newline="") as fp:
+        misses = list(csv.reader(fp))
+    return rows, misses
+
+
+@pytest.fixture(scope="module")
+def default_run(tmp_path_factory):
+    return generate(tmp_path_factory.mktemp("default"), "default")
+
+
+def test_default_run(default_run):
+    rows, misses = default_run
+    by_designator = {row[0]: row[4:] for row in rows[1:]}
+    assert by_designator["R1"] == ["'1000'", "'ACME R10K,OTHER R10K'"]
+    # RES-SMD is defined in two cells, both contribute matches
+    assert sorted(by_designator["R2"][1::2]) == ["'ACME R22K'", "'PREC R22K'"]
+    # An empty part number matches every row of its PART tables
+    assert len(by_designator["R3"]) == 2 * 5
+    assert len(by_designator["U2"]) == 2 * 2
+    assert by_designator["U3"] == []
+    assert by_designator["X1"] == []
+    assert [(miss[0], miss[3]) for miss in misses[1:]] == [
+        ("8", "no matching part"),
+        ("9", "unknown part type"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--shards", "2"],
+        ["--max_memory", "0"],
+        ["--shards", "2", "--max_memory", "0"],
+    ],
+    ids=["shards", "max_memory", "shards_max_memory"],
+)
+def test_same_output_as_default_run(tmp_path, default_run, options):
+    assert generate(tmp_path, "output", *options) == default_run
+
+
+def test_max_memory_spills_every_table():
+    index = entrypoint.index_libraries(os.path.join(LIBRARY, "share", "library"), 0)
+    try:
+        assert index.spilled
+        matches = index.lookup("RES-SMD", "2000", ["AML"])
+        assert sorted(matches) == [["'ACME R22K'"], ["'PREC R22K'"]]
+    finally:
+        index.close()
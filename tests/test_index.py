@@ -0,0 +1,51 @@
+import pytest
+from conftest import LIBRARY, table_path
+
+from cell import PartTableFile
+from index import PartIndex, Usage, describe_collisions
+
+PROJECT_SPECIFIC = table_path(LIBRARY, "project_specific", "res_smd")
+DISCRETE = table_path(LIBRARY, "discrete", "res_smd")
+OPAMP = table_path(LIBRARY, "ic", "opamp")
+
+
+@pytest.fixture(params=[None, 0], ids=["memory", "spilled"])
+def index(request):
+    index = PartIndex(request.param)
+    # Published out of discovery order, as parsed files complete
+    for seq, path in [(2, OPAMP), (1, DISCRETE), (0, PROJECT_SPECIFIC)]:
+        index.add(seq, PartTableFile.parse(path))
+    yield index
+    index.close()
+
+
+def test_where_used_part_number(index):
+    assert index.where_used("3000") == [Usage("DISCRETE", "RES_SMD", "RES-SMD", 3)]
+
+
+def test_where_used_aml_tokens(index):
+    assert index.where_used("OTHER R10K") == [Usage("DISCRETE", "RES_SMD", "RES-SMD", 1)]
+    assert index.where_used("ADI AD2") == [Usage("IC", "OPAMP", "OPAMP", 1)]
+
+
+def test_where_used_ignores_case(index):
+    assert index.where_used(" op2 ") == index.where_used("OP2") != []
+
+
+def test_where_used_follows_discovery_order(index):
+    assert index.where_used("2000") == [
+        Usage("PROJ_SPCF", "RES_SMD", "RES-SMD", 1),
+        Usage("DISCRETE", "RES_SMD", "RES-SMD", 2),
+    ]
+
+
+def test_where_used_miss(index):
+    assert index.where_used("NOPE") == []
+
+
+def test_describe_collisions(index):
+    assert index.collisions() == {"RES-SMD": [("PROJ_SPCF", "RES_SMD"), ("DISCRETE", "RES_SMD")]}
+    assert describe_collisions(index) == [
+        "PART 'RES-SMD' is defined by 2 cells, all 2 cells contribute matches in discovery"
+        " order: PROJ_SPCF/RES_SMD, DISCRETE/RES_SMD"
+    ]
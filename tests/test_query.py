@@ -0,0 +1,31 @@
+import csv
+import io
+
+import entrypoint
+from conftest import LIBRARY
+
+
+def query(capsys, *argv):
+    assert entrypoint.query(["--library_path", LIBRARY, *argv]) == 0
+    return list(csv.reader(io.StringIO(capsys.readouterr().out)))
+
+
+def test_misses_get_a_row(capsys):
+    rows = query(capsys, "op1", "NOPE")
+    assert rows == [
+        ["part_number", "library", "cell", "part", "row"],
+        ["op1", "IC", "OPAMP", "OPAMP", "1"],
+        ["NOPE", "", "", "", ""],
+    ]
+
+
+def test_cache_path(capsys, monkeypatch, tmp_path):
+    cache_path = str(tmp_path / "library.cache")
+    first = query(capsys, "--cache_path", cache_path, "2000", "ACME R47K")
+    assert len(first) == 1 + 3
+
+    def index_libraries(*args):
+        raise AssertionError("the library was parsed again")
+
+    monkeypatch.setattr(entrypoint, "index_libraries", index_libraries)
+    assert query(capsys, "--cache_path", cache_path, "2000", "ACME R47K") == first
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+import os
+
+import pytest
+from conftest import BOM, LIBRARY, edit, table_path
+
+import entrypoint
+import server
+
+QUERY = {
+    "part_number_column_name": "Part Number",
+    "part_type_column_name": "Part Type",
+    "include_ptf_columns": "PART_NUMBER,AML",
+    "add_bom_columns": "PN,MPN",
+}
+
+
+@pytest.fixture(scope="module")
+def index():
+    watcher = server.LibraryWatcher(LIBRARY)
+    watcher.refresh()
+    return watcher.index
+
+
+def test_enrich_csv_matches_a_local_run(index, tmp_path):
+    output_path = str(tmp_path / "bom.csv")
+    argv = [BOM, "--library_path", LIBRARY, "--output_path", output_path]
+    for name, value in QUERY.items():
+        argv += ["--" + name, value]
+    argv += ["--search_ptf_column_name", "PART_NUMBER"]
+    assert entrypoint.generate_bom(argv) == 0
+    with open(output_path, newline="") as fp:
+        expected = list(csv.reader(fp))
+
+    with open(BOM) as fp:
+        enriched_bom = server.enrich_csv(index, fp.read(), QUERY)
+    assert list(csv.reader(io.StringIO(enriched_bom))) == expected
+
+
+def test_enrich_csv_multiple_matches(index):
+    bom = "Part Number,Part Type\n2000,RES-SMD\n"
+    enriched_bom = server.enrich_csv(index, bom, {**QUERY, "multiple_matches": "join"})
+    rows = list(csv.reader(io.StringIO(enriched_bom)))
+    assert rows[0] == ["Part Number", "Part Type", "PN", "MPN"]
+    assert sorted(rows[1][3].split("; ")) == ["'ACME R22K'", "'PREC R22K'"]
+
+
+def test_enrich_csv_rejects_mismatched_columns(index):
+    query = {**QUERY, "include_ptf_columns": "PART_NUMBER,AML,DESCRIPTION"}
+    with pytest.raises(ValueError):
+        server.enrich_csv(index, "Part Number,Part Type\n1000,RES-SMD\n", query)
+
+
+def test_where_used_json(index):
+    used = json.loads(server.where_used_json(index, ["op1", "ti opa4", "NOPE"]))
+    assert used == {
+        "op1": [{"library": "IC", "cell": "OPAMP", "part": "OPAMP", "row": 1}],
+        "ti opa4": [{"library": "IC", "cell": "OPAMP", "part": "OPAMP", "row": 2}],
+        "NOPE": [],
+    }
+
+
+def test_refresh_picks_up_changes(library_copy):
+    watcher = server.LibraryWatcher(library_copy)
+    assert watcher.refresh()
+    assert not watcher.refresh()
+
+    edit(table_path(library_copy, "ic", "opamp"), "'QUAD OPAMP'", "'QUAD OPAMP LOW NOISE'")
+    assert watcher.refresh()
+    assert watcher.index.lookup("OPAMP", "OP2", ["DESCRIPTION"]) == [["'QUAD OPAMP LOW NOISE'"]]
+
+    os.remove(table_path(library_copy, "discrete", "res_smd"))
+    assert watcher.refresh()
+    assert watcher.index.lookup("RES-SMD", "1000", ["DESCRIPTION"]) == []
+    assert watcher.index.lookup("RES-SMD", "4000", ["DESCRIPTION"]) == [["'RES 100K'"]]
+
+
+def test_refresh_survives_a_bad_file(library_copy):
+    watcher = server.LibraryWatcher(library_copy)
+    assert watcher.refresh()
+
+    # Rows that no longer fit the header, as in a half saved file
+    edit(table_path(library_copy, "ic", "opamp"), "'QUAD' | ''", "'QUAD' | '' | 'EXTRA'")
+    assert watcher.refresh()
+    assert watcher.index.lookup("OPAMP", "OP2", ["DESCRIPTION"]) == [["'QUAD OPAMP'"]]
+
+    # Several changed files are parsed in worker processes, the good ones are indexed
+    edit(table_path(library_copy, "ic", "opamp"), "'DUAL' | ''", "'DUAL' | '' | 'EXTRA'")
+    edit(table_path(library_copy, "discrete", "res_smd"), "'RES 47K'", "'RES 47K 1W'")
+    assert watcher.refresh()
+    assert watcher.index.lookup("OPAMP", "OP1", ["DESCRIPTION"]) == [["'DUAL OPAMP'"]]
+    assert watcher.index.lookup("RES-SMD", "3000", ["DESCRIPTION"]) == [["'RES 47K 1W'"]]
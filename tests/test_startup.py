@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that a run hitting the cache must not import
+HEAVY_MODULES = ["parsy", "combinators", "ptflib", "css", "concurrent.futures"]
+# Import time budget of the entrypoint, in microseconds
+STARTUP_BUDGET = 200_000
+
+
+def test_entrypoint_startup_cost():
+    code = "import sys, entrypoint; print(','.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = set(result.stdout.strip().split(","))
+    assert not modules & set(HEAVY_MODULES)
+
+    # The last line of -X importtime is the entrypoint, with its cumulative time
+    cumulative = int(result.stderr.splitlines()[-1].split("|")[1])
+    assert cumulative < STARTUP_BUDGET
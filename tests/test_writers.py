@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import writers
+
+
+def test_check_columns():
+    writers.check_columns(["Designator", "Qty"], ["PART_NUMBER", "AML"], ["PN", "MPN"])
+    with pytest.raises(ValueError, match="one to one"):
+        writers.check_columns(["Designator"], ["PART_NUMBER", "AML", "STATUS"], ["PN", "MPN"])
+    with pytest.raises(ValueError, match="repeated: Qty"):
+        writers.check_columns(["Designator", "Qty"], ["PART_NUMBER", "AML"], ["PN", "Qty"])
+    with pytest.raises(ValueError, match="repeated: PN"):
+        writers.check_columns([], ["PART_NUMBER", "AML"], ["PN", "PN"])
+
+
+LINE_ITEMS = [["R1", "1000"], ["R2", "2000", "extra"], ["U3"]]
+MATCHES = [
+    [["1000", "ACME R10K"]],
+    [["2000", "PREC R22K"], ["2000", "ACME R22K"]],
+    [],
+]
+
+
+def shape(policy):
+    return list(writers.shape_rows(LINE_ITEMS, MATCHES, 2, 2, policy))
+
+
+def test_append():
+    assert shape(writers.APPEND) == [
+        ["R1", "1000", "1000", "ACME R10K"],
+        ["R2", "2000", "extra", "2000", "PREC R22K", "2000", "ACME R22K"],
+        ["U3"],
+    ]
+
+
+def test_first():
+    assert shape(writers.FIRST) == [
+        ["R1", "1000", "1000", "ACME R10K"],
+        ["R2", "2000", "2000", "PREC R22K"],
+        ["U3", "", "", ""],
+    ]
+
+
+def test_join():
+    assert shape(writers.JOIN) == [
+        ["R1", "1000", "1000", "ACME R10K"],
+        ["R2", "2000", "2000; 2000", "PREC R22K; ACME R22K"],
+        ["U3", "", "", ""],
+    ]
+
+
+def test_rows():
+    assert shape(writers.ROWS) == [
+        ["R1", "1000", "1000", "ACME R10K"],
+        ["R2", "2000", "2000", "PREC R22K"],
+        ["R2", "2000", "2000", "ACME R22K"],
+        ["U3", "", "", ""],
+    ]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        shape("last")
+
+
+def test_batches():
+    assert [len(batch) for batch in writers.batches(range(5), 2)] == [2, 2, 1]
+
+
+def test_write_jsonl(tmp_path):
+    path = str(tmp_path / "bom.jsonl")
+    rows = [*shape(writers.ROWS), ["Ω1", "µ", "", ""]]
+    writers.write_bom(path, writers.JSONL, ["Designator", "Part Number", "PN", "MPN"], rows)
+    with open(path, encoding="utf_8") as fp:
+        lines = [json.loads(line) for line in fp]
+    assert len(lines) == 5
+    assert lines[1] == {
+        "Designator": "R2",
+        "Part Number": "2000",
+        "PN": "2000",
+        "MPN": "PREC R22K",
+    }
+    assert lines[4]["Designator"] == "Ω1"
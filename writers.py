@@ -0,0 +1,151 @@
+"""
+The writers module writes the enriched BOM, in batches, as CSV, JSON Lines or
+Parquet. Rows are written once the whole BOM is enriched, since the last part
+table parsed may still add a match to any line item.
+
+Every format but the legacy CSV layout has a fixed schema: the BOM title row
+followed by the columns added with --add_bom_columns. How the rows of several
+matching PTF rows fill those columns is set by a multiple matches policy.
+"""
+
+import csv
+import importlib.util
+import json
+from collections import Counter
+from itertools import islice
+
+CSV = "csv"
+JSONL = "jsonl"
+PARQUET = "parquet"
+FORMATS = [CSV, JSONL, PARQUET]
+
+# Each match appends its group of columns, so rows may be ragged (legacy CSV)
+APPEND = "append"
+# Values of the first match only
+FIRST = "first"
+# Values of all matches joined in each column
+JOIN = "join"
+# One output row per match
+ROWS = "rows"
+POLICIES = [APPEND, FIRST, JOIN, ROWS]
+
+JOIN_SEPARATOR = "; "
+BATCH_SIZE = 1024
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def check_columns(
+    title_row_columns: list[str], ptf_columns: list[str], bom_columns: list[str]
+) -> None:
+    """
+    Raises ValueError unless every PTF column has its output column and the
+    output column names are unique, as the fixed schemas require.
+    """
+    if len(ptf_columns) != len(bom_columns):
+        raise ValueError(
+            f"include_ptf_columns has {len(ptf_columns)} columns but add_bom_columns has"
+            f" {len(bom_columns)}, they must match one to one"
+        )
+    counts = Counter(title_row_columns + bom_columns)
+    repeated = [column for column, count in counts.items() if count > 1]
+    if repeated:
+        raise ValueError("Output columns are repeated: " + ", ".join(repeated))
+
+
+def shape_rows(
+    line_items: list[list[str]],
+    matches: list[list[list[str]]],
+    num_bom_columns: int,
+    num_new_columns: int,
+    policy: str,
+):
+    """
+    Yields the output rows of the line items and their matches, following the
+    multiple matches policy. Except for APPEND, rows have exactly
+    num_bom_columns + num_new_columns values.
+    """
+    blank = [""] * num_new_columns
+    for item, item_matches in zip(line_items, matches):
+        if policy == APPEND:
+            yield item + [value for values in item_matches for value in values]
+            continue
+        item = (item + [""] * (num_bom_columns - len(item)))[:num_bom_columns]
+        if not item_matches:
+            yield item + blank
+        elif policy == FIRST:
+            yield item + item_matches[0]
+        elif policy == JOIN:
+            yield item + [JOIN_SEPARATOR.join(column) for column in zip(*item_matches)]
+        elif policy == ROWS:
+            for values in item_matches:
+                yield item + values
+        else:
+            raise ValueError("Unknown multiple matches policy: " + policy)
+
+
+def batches(rows, size: int = BATCH_SIZE):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class CsvWriter:
+    def __init__(self, path: str, columns: list[str]):
+        self.fp = open(path, "w")
+        self.writer = csv.writer(self.fp)
+        self.writer.writerow(columns)
+
+    def write_batch(self, rows: list[list[str]]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.fp.close()
+
+
+class JsonlWriter:
+    def __init__(self, path: str, columns: list[str]):
+        self.fp = open(path, "w", encoding="utf_8")
+        self.columns = columns
+
+    def write_batch(self, rows: list[list[str]]) -> None:
+        self.fp.writelines(
+            json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+
+    def close(self) -> None:
+        self.fp.close()
+
+
+class ParquetWriter:
+    def __init__(self, path: str, columns: list[str]):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_batch(self, rows: list[list[str]]) -> None:
+        arrays = [self.pyarrow.array(column, self.pyarrow.string()) for column in zip(*rows)]
+        self.writer.write_batch(self.pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+WRITERS = {CSV: CsvWriter, JSONL: JsonlWriter, PARQUET: ParquetWriter}
+
+
+def write_bom(path: str, output_format: str, columns: list[str], rows) -> None:
+    """
+    Writes the output rows to path in batches of BATCH_SIZE rows.
+    """
+    writer = WRITERS[output_format](path, columns)
+    try:
+        for batch in batches(rows):
+            writer.write_batch(batch)
+    finally:
+        writer.close()